@@ -1,7 +1,9 @@
 # app.py
 import os
 import json
+import logging
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from openai import OpenAI
@@ -13,8 +15,21 @@ load_dotenv()
 # Import tools
 from tools import (
     geocode_place, canton_from_place, get_weather_by_place,
-    get_water_data, list_species_by_place, check_rules
+    get_water_data, list_species_by_place, check_rules, rules_calendar, get_spot_report
 )
+from services import metrics
+from services.log import configure as configure_logging
+from services.answers import answer_cache, ENABLED as ANSWER_CACHE_ENABLED
+from services.hydro import start_prefetcher, PREFETCH as HYDRO_PREFETCH
+from services.conditions import conditions, MAX_SPOTS
+from services.registry import open_registry, DEFAULT_SESSION
+from services.rules import rules_calendar as calendar_for
+from services.runs import RunManager, parse_event_id
+from services.thread_context import ThreadContext
+from services.uploads import sha256_stream
+
+configure_logging()
+log = logging.getLogger("fishbuddy.app")
 
 app = Flask(__name__)
 CORS(app)
@@ -28,83 +43,303 @@ if not api_key:
 if not assistant_id:
     raise ValueError("ASSISTANT_ID not set in environment")
 
-print(f"[INFO] Using API Key: {api_key[:20]}...")
-print(f"[INFO] Using Assistant ID: {assistant_id}")
+log.info("Using API Key: %s...", api_key[:20])
+log.info("Using Assistant ID: %s", assistant_id)
 
 client = OpenAI(api_key=api_key)
 
-# Keep track of uploaded files per session
-session_files = {}
+# Truncation, context deltas and summaries for long threads
+thread_context = ThreadContext(client)
 
-def dispatch_tools(thread_id, run_id, max_retries=5):
-    """Execute all tool calls for a run and submit outputs."""
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        
-        if run.status != "requires_action":
-            return run
-        
-        retry_count += 1
-        ra = getattr(run, "required_action", None)
-        if not ra or getattr(ra, "type", None) != "submit_tool_outputs":
-            return run
+# Uploaded files per thread; the SQLite backend is shared by all workers
+file_registry = open_registry()
 
-        print(f"[DEBUG] Processing {len(ra.submit_tool_outputs.tool_calls)} tool calls (retry {retry_count})...")
-        outs = []
-        
-        for call in ra.submit_tool_outputs.tool_calls:
-            name = call.function.name
-            args = json.loads(call.function.arguments or "{}")
-            print(f"[DEBUG] Executing tool: {name} with args: {args}")
-            
-            try:
-                if name == "geocode_place":
-                    out = geocode_place(**args)
-                elif name == "canton_from_place":
-                    out = canton_from_place(**args)
-                elif name == "get_weather_by_place":
-                    out = get_weather_by_place(**args)
-                elif name == "get_water_data":
-                    out = get_water_data(**args)
-                elif name == "list_species_by_place":
-                    out = list_species_by_place(**args)
-                elif name == "check_rules":
-                    out = check_rules(**args)
-                else:
-                    out = json.dumps({"error": f"unknown tool {name}"})
-                
-                print(f"[DEBUG] Tool {name} returned: {str(out)[:100]}...")
-            except Exception as e:
-                print(f"[ERROR] Tool {name} failed: {e}")
-                out = json.dumps({"error": f"tool_execution_failed: {str(e)}"})
-            
-            outs.append({"tool_call_id": call.id, "output": out})
-
-        # Submit tool outputs and continue the run
-        print(f"[DEBUG] Submitting {len(outs)} tool outputs...")
-        client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread_id,
-            run_id=run_id,
-            tool_outputs=outs
-        )
-        time.sleep(0.5)
-    
-    if retry_count >= max_retries:
-        print(f"[ERROR] Max retries ({max_retries}) reached for run {run_id}")
-    
-    return run
+# Keep every hydro station's latest reading in memory (HYDRO_PREFETCH=1)
+if HYDRO_PREFETCH:
+    start_prefetcher()
+
+TOOLS = {
+    "geocode_place": geocode_place,
+    "canton_from_place": canton_from_place,
+    "get_weather_by_place": get_weather_by_place,
+    "get_water_data": get_water_data,
+    "list_species_by_place": list_species_by_place,
+    "check_rules": check_rules,
+    "rules_calendar": rules_calendar,
+    "get_spot_report": get_spot_report,
+}
+
+# Tool calls of one run are executed concurrently on a bounded pool shared by
+# all requests; each call gets its own wall-clock budget once it starts, and
+# the batch as a whole, queueing included, gets TOOL_BATCH_TIMEOUT.
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+TOOL_BATCH_TIMEOUT = float(os.getenv("TOOL_BATCH_TIMEOUT", str(2 * TOOL_TIMEOUT)))
+tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_WORKERS", "16")),
+    thread_name_prefix="tool",
+)
+
+def run_tool(name, arguments):
+    """Execute a single tool call and return its output string."""
+    fn = TOOLS.get(name)
+    if fn is None:
+        metrics.TOOL_ERRORS.inc("unknown", "unknown_tool")
+        log.warning("Unknown tool requested: %s", name)
+        return json.dumps({"error": f"unknown tool {name}"})
+
+    started = time.perf_counter()
+    try:
+        args = json.loads(arguments or "{}")
+        log.debug("Executing tool: %s with args: %s", name, args)
+        out = fn(**args)
+        log.debug("Tool %s returned: %.100s...", name, out)
+        if isinstance(out, str) and out.startswith('{"error"'):
+            metrics.TOOL_ERRORS.inc(name, "error_result")
+        return out
+    except Exception as e:
+        metrics.TOOL_ERRORS.inc(name, "exception")
+        log.error("Tool %s failed: %s", name, e, extra={"tool": name})
+        return json.dumps({"error": f"tool_execution_failed: {str(e)}"})
+    finally:
+        metrics.TOOL_SECONDS.observe(time.perf_counter() - started, name)
+
+class ToolCall:
+    """
+    A tool call submitted to the shared pool. `started` resolves to the
+    monotonic time the call begins running, so timeouts can exclude time
+    spent queued behind other runs' tools; `deadline` bounds the queueing.
+    """
+
+    def __init__(self, call, deadline):
+        self.call = call
+        self.deadline = deadline
+        self.started = Future()
+        self.future = tool_executor.submit(self._run)
+
+    def _run(self):
+        if not self.started.done():  # an async waiter may have given up already
+            self.started.set_result(time.monotonic())
+        return run_tool(self.call.function.name, self.call.function.arguments)
+
+    def expire(self) -> bool:
+        """Cancel the call if it is still queued; False if it has started."""
+        return self.future.cancel()
+
+    def until(self, started, timeout):
+        """Monotonic time by which a call that started at `started` must finish."""
+        return min(started + timeout, self.deadline)
+
+    def result(self, timeout):
+        """
+        Output within `timeout` seconds of the call starting and before
+        the batch deadline. A call still queued at the deadline is
+        cancelled and raises FutureTimeout.
+        """
+        try:
+            started = self.started.result(timeout=max(0.0, self.deadline - time.monotonic()))
+        except FutureTimeout:
+            if self.expire():
+                raise
+            started = self.started.result()  # picked up just now
+        return self.future.result(timeout=max(0.0, self.until(started, timeout) - time.monotonic()))
+
+def execute_tool_calls(tool_calls, timeout=None):
+    """
+    Run a batch of tool calls concurrently.
+    Returns [{"tool_call_id", "output"}] in the same order as `tool_calls`;
+    a call that exceeds its timeout (counted from when it starts running
+    on the shared pool), or is still queued TOOL_BATCH_TIMEOUT after the
+    batch was submitted, yields an error output instead of blocking the
+    rest of the batch.
+    """
+    timeout = TOOL_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + TOOL_BATCH_TIMEOUT
+    pending = [ToolCall(call, deadline) for call in tool_calls]
+
+    outs = []
+    for pc in pending:
+        name = pc.call.function.name
+        try:
+            out = pc.result(timeout)
+        except FutureTimeout:
+            reason = "queue_timeout" if pc.future.cancelled() else "timeout"
+            metrics.TOOL_ERRORS.inc(name, reason)
+            log.error("Tool %s timed out (%s)", name, reason)
+            out = json.dumps({"error": f"tool_timeout: {name}"})
+        outs.append({"tool_call_id": pc.call.id, "output": out})
+    return outs
+
+# Expired registry entries are purged in bulk at most this often; OpenAI
+# files no thread references any more are then deleted in the background.
+FILE_SWEEP_INTERVAL = float(os.getenv("FILE_SWEEP_INTERVAL", "300"))
+_cleanup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-cleanup")
+_last_sweep = 0.0
+# Runs are driven on background workers and buffered for resuming clients
+run_manager = RunManager()
+metrics.gauge("fishbuddy_run_streams", "Run buffers held for (re)attaching clients.", (), lambda: {(): len(run_manager)})
+# Thread bookkeeping for answers served from the answer cache
+_history_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="thread-history")
+
+def delete_remote_files(file_ids):
+    for file_id in file_ids:
+        try:
+            with metrics.openai_call("files.delete"):
+                client.files.delete(file_id)
+        except Exception as e:
+            log.warning("Could not delete expired file %s: %s", file_id, e)
+
+def _purge_expired_files():
+    orphans = file_registry.purge_expired()
+    if orphans:
+        log.info("Deleting %d expired files", len(orphans))
+        delete_remote_files(orphans)
+
+def sweep_files():
+    """Schedule a registry purge if the last one is older than FILE_SWEEP_INTERVAL."""
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < FILE_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    _cleanup_pool.submit(_purge_expired_files)
+
+def sse_event(payload):
+    """Encode a payload as a single Server-Sent Events `data:` frame."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+def relay_run_events(thread_id, stream, answer=None):
+    """
+    Yield payloads for one Assistants event stream.
+    Text deltas are forwarded as {"text"} payloads the moment they arrive.
+    On `thread.run.requires_action` the tool calls are executed and their
+    outputs submitted with stream=True; the continuation stream is
+    returned so the caller can keep relaying. Returns None once the run
+    has finished.
+    If `answer` is a list, text deltas are appended to it and a failed
+    run appends None.
+    """
+    with stream:
+        for event in stream:
+            kind = event.event
+
+            if kind == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    text = getattr(part, "text", None)
+                    if part.type == "text" and text and text.value:
+                        if answer is not None:
+                            answer.append(text.value)
+                        yield {"text": text.value}
+
+            elif kind == "thread.run.created":
+                log.info("Run created: %s", event.data.id)
+
+            elif kind == "thread.run.requires_action":
+                run = event.data
+                tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                log.debug("Processing %d tool calls for run %s...", len(tool_calls), run.id)
+                outs = execute_tool_calls(tool_calls)
+                log.debug("Submitting %d tool outputs...", len(outs))
+                with metrics.openai_call("runs.submit_tool_outputs"):
+                    return client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=outs,
+                        stream=True,
+                    )
+
+            elif kind in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+                run = event.data
+                log.info("Run reached terminal state: %s", run.status)
+                error = getattr(run, "last_error", None)
+                if answer is not None:
+                    answer.append(None)
+                yield {"error": getattr(error, "message", None) or f"run_{run.status}"}
+                return None
+
+            elif kind == "thread.run.completed":
+                log.info("Run reached terminal state: completed")
+                observe_usage(event.data)
+                return None
+
+            elif kind == "error":
+                log.error("Run stream error: %s", event.data)
+                if answer is not None:
+                    answer.append(None)
+                yield {"error": getattr(event.data, "message", None) or "stream_error"}
+                return None
+
+    return None
+
+def observe_usage(run):
+    """Record prompt tokens of a completed run, when the API reports usage."""
+    usage = getattr(run, "usage", None)
+    if usage is not None and usage.prompt_tokens is not None:
+        metrics.RUN_PROMPT_TOKENS.observe(usage.prompt_tokens)
+
+def run_payloads(thread_id, stream, answer_key=None):
+    """
+    All payloads of a run, following tool-output continuations. A run
+    that completes without error is stored in the answer cache under
+    `answer_key`.
+    """
+    answer = [] if answer_key is not None else None
+    current = stream
+    try:
+        while current is not None:
+            current = yield from relay_run_events(thread_id, current, answer)
+    except Exception as e:
+        log.error("Stream failed: %s", e)
+        yield {"error": str(e)}
+        return
+    if answer and None not in answer:
+        answer_cache.put(answer_key, "".join(answer))
+
+def observe_stream(frames, started, outcome="ok"):
+    """Pass SSE frames through, recording time to first frame and stream duration."""
+    first = True
+    try:
+        for frame in frames:
+            if first and "data:" in frame:
+                metrics.CHAT_TTFB.observe(time.perf_counter() - started)
+                first = False
+            if 'data: {"error"' in frame:
+                outcome = "error"
+            yield frame
+    except GeneratorExit:
+        outcome = "disconnected"
+        raise
+    finally:
+        metrics.CHAT_SECONDS.observe(time.perf_counter() - started, outcome)
+
+def sse_response(frames):
+    return Response(
+        frames,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def record_turn(thread_id, context, message, text):
+    """Append a cache-served question and answer so the thread history stays complete."""
+    try:
+        content, mode = thread_context.compose(thread_id, context, message)
+        with metrics.openai_call("messages.create"):
+            client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content)
+        thread_context.commit(thread_id, context, mode)
+        with metrics.openai_call("messages.create"):
+            client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=text)
+    except Exception as e:
+        log.warning("Could not record cached answer in thread %s: %s", thread_id, e)
 
 @app.route("/api/thread", methods=["POST"])
 def create_thread():
     """Create a new thread for this session."""
     try:
-        thread = client.beta.threads.create()
-        print(f"[INFO] Created thread: {thread.id}")
+        with metrics.openai_call("threads.create"):
+            thread = client.beta.threads.create()
+        log.info("Created thread: %s", thread.id)
         return jsonify({"thread_id": thread.id})
     except Exception as e:
-        print(f"[ERROR] Failed to create thread: {e}")
+        log.error("Failed to create thread: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/chat", methods=["GET"])
@@ -113,6 +348,7 @@ def chat():
     Stream assistant response using Server-Sent Events.
     Query params: thread_id, message, context
     """
+    started = time.perf_counter()
     try:
         thread_id = request.args.get("thread_id")
         message = request.args.get("message")
@@ -126,98 +362,105 @@ def chat():
         except:
             context = {}
 
-        print(f"[INFO] Chat request: thread={thread_id}, message={message[:50]}...")
+        # EventSource reconnects to the same URL with the last id it saw;
+        # resume from the run's buffer instead of posting the message again
+        last_event_id = request.headers.get("Last-Event-ID")
+        if last_event_id:
+            stream_id, after = parse_event_id(last_event_id)
+            run = run_manager.get(stream_id)
+            if run is None or run.key != thread_id:
+                return sse_response(iter([sse_event({"error": "stream_expired"}), sse_event({"done": True})]))
+            log.info("Resuming run stream %s after event %d", stream_id, after)
+            return sse_response(observe_stream(run.follow(after), started, outcome="resumed"))
 
-        # Add user message
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=f"StructuredContext: {context}\nQuestion: {message}",
-        )
+        log.info("Chat request: thread=%s, message=%.50s...", thread_id, message)
+        content = f"StructuredContext: {context}\nQuestion: {message}"
 
-        # Start run
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=assistant_id,
-        )
-        print(f"[INFO] Run created: {run.id}")
-
-        def stream_response():
-            """Poll run, handle tools, yield streaming response."""
-            terminal = {"completed", "failed", "cancelled", "expired"}
-            poll_count = 0
-            
-            while poll_count < 50:  # Max 50 polls = ~25 seconds
-                poll_count += 1
-                run_status = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-                print(f"[DEBUG] Poll #{poll_count}: run status = {run_status.status}")
-                
-                if run_status.status == "requires_action":
-                    run_status = dispatch_tools(thread_id, run.id, max_retries=3)
-                    time.sleep(0.5)
-                    continue
-                
-                if run_status.status in terminal:
-                    print(f"[INFO] Run reached terminal state: {run_status.status}")
-                    break
-                
-                time.sleep(0.5)
-            
-            if poll_count >= 50:
-                print(f"[WARN] Poll limit reached, stopping stream")
-
-            # Fetch latest assistant message
-            msgs = client.beta.threads.messages.list(
-                thread_id=thread_id,
-                order="desc",
-                limit=20,
-            )
-            
-            latest = next(
-                (m for m in msgs.data if m.role == "assistant" and getattr(m, "run_id", None) == run.id),
-                None
-            ) or next((m for m in msgs.data if m.role == "assistant"), None)
-
-            if latest:
-                for c in latest.content:
-                    if getattr(c, "type", None) == "text" and getattr(c, "text", None):
-                        text = c.text.value or ""
-                        # Simulate streaming by yielding line by line
-                        for line in text.split("\n"):
-                            if line.strip():
-                                yield f"data: {json.dumps({'text': line})}\n\n"
-            
-            yield "data: {\"done\": true}\n\n"
-
-        return Response(stream_response(), mimetype="text/event-stream")
+        # Claim the thread before posting anything, so two identical
+        # requests can't both add the message and start a run
+        run, created = run_manager.reserve(thread_id, content)
+        if not created:
+            if run.content != content:
+                return jsonify({"error": "A run is already in progress for this thread"}), 409
+            # Same question re-sent while its run is live: attach instead of starting another
+            return sse_response(observe_stream(run.follow(0), started))
+
+        answer_key = answer_cache.key(message, context) if ANSWER_CACHE_ENABLED else None
+        if answer_key is not None:
+            cached = answer_cache.get(answer_key)
+            if cached is not None:
+                log.info("Answer cache hit: thread=%s", thread_id)
+                _history_pool.submit(record_turn, thread_id, context, message, cached)
+                run_manager.drive(run, iter([{"text": cached}]))
+                return sse_response(observe_stream(run.follow(0), started, outcome="cached"))
+
+        try:
+            # Add user message; StructuredContext is only resent when the thread lacks it
+            posted, mode = thread_context.compose(thread_id, context, message)
+            with metrics.openai_call("messages.create"):
+                client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role="user",
+                    content=posted,
+                )
+            thread_context.commit(thread_id, context, mode)
+
+            # Start a streamed run; events arrive as the assistant produces them
+            with metrics.openai_call("runs.create"):
+                stream = client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=assistant_id,
+                    stream=True,
+                    **thread_context.run_options(thread_id),
+                )
+        except Exception as e:
+            run_manager.release(run, error=str(e))
+            raise
+
+        # The run is driven in the background; this response only follows its buffer
+        run_manager.drive(run, run_payloads(thread_id, stream, answer_key))
+        return sse_response(observe_stream(run.follow(0), started))
     
     except Exception as e:
-        print(f"[ERROR] Chat endpoint failed: {e}")
+        log.error("Chat endpoint failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/upload", methods=["POST"])
 def upload_file():
-    """Upload a file to OpenAI."""
+    """Upload a file to OpenAI and register it for the caller's thread."""
     try:
         if "file" not in request.files:
             return jsonify({"error": "No file provided"}), 400
         
         file = request.files["file"]
         filename = file.filename
-        
-        print(f"[INFO] Uploading file to OpenAI: {filename}")
-        
-        # Convert Flask FileStorage to bytes
-        file_bytes = file.read()
-        
-        # Upload to OpenAI Files API using bytes
-        file_response = client.files.create(
-            file=(filename, file_bytes),
-            purpose="assistants"
-        )
+        session_id = request.form.get("thread_id") or DEFAULT_SESSION
+        sweep_files()
+
+        # The form parser spools large bodies to a temp file; hash it in
+        # chunks and hand the stream itself to the Files API so no upload
+        # is ever held in memory whole.
+        sha256, size = sha256_stream(file.stream)
+        known = file_registry.find_content(sha256)
+        if known is not None:
+            log.info("Duplicate upload %s matches %s", filename, known["file_id"])
+            file_registry.add(session_id, known["file_id"], filename, sha256=sha256, size=size)
+            return jsonify({
+                "file_id": known["file_id"],
+                "filename": filename,
+                "status": "duplicate"
+            })
+
+        log.info("Uploading file to OpenAI: %s (%d bytes)", filename, size)
+
+        with metrics.openai_call("files.create"):
+            file_response = client.files.create(
+                file=(filename, file.stream),
+                purpose="assistants"
+            )
         
         file_id = file_response.id
-        print(f"[INFO] File uploaded to OpenAI: {file_id}")
+        log.info("File uploaded to OpenAI: %s", file_id)
         
         # Attach file to assistant
         try:
@@ -225,16 +468,13 @@ def upload_file():
                 assistant_id=assistant_id,
                 file_ids=[file_id]
             )
-            print(f"[INFO] File attached to assistant: {file_id}")
+            log.info("File attached to assistant: %s", file_id)
         except Exception as e:
-            print(f"[WARN] Could not attach file to assistant: {e}")
+            log.warning("Could not attach file to assistant: %s", e)
         
-        # Track the file in current session only
-        session_files[file_id] = {
-            "id": file_id,
-            "filename": filename,
-            "uploaded_at": time.time()
-        }
+        # Track the file for this thread only
+        file_registry.add(session_id, file_id, filename, sha256=sha256, size=size)
+        file_registry.add_content(sha256, file_id, size)
         
         return jsonify({
             "file_id": file_id,
@@ -243,55 +483,108 @@ def upload_file():
         })
     
     except Exception as e:
-        print(f"[ERROR] Upload failed: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Upload failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/files", methods=["GET"])
 def list_files():
-    """List files uploaded in current session only."""
+    """List files uploaded in the caller's thread only."""
     try:
-        # Return only files from current session
+        session_id = request.args.get("thread_id") or DEFAULT_SESSION
+        sweep_files()
         files_list = [
-            {
-                "id": file_id,
-                "filename": data["filename"]
-            }
-            for file_id, data in session_files.items()
+            {"id": f["id"], "filename": f["filename"]}
+            for f in file_registry.list(session_id)
         ]
         
-        print(f"[INFO] Returning {len(files_list)} session files")
+        log.debug("Returning %d session files", len(files_list))
         
         return jsonify({"files": files_list})
     except Exception as e:
-        print(f"[ERROR] List files failed: {e}")
+        log.error("List files failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/files/<file_id>", methods=["DELETE"])
 def delete_file(file_id):
-    """Delete a file from current session and OpenAI."""
+    """Remove a file from the caller's thread; delete it from OpenAI once no thread uses it."""
     try:
-        # Delete from OpenAI
-        client.files.delete(file_id)
-        print(f"[INFO] File deleted from OpenAI: {file_id}")
-        
-        # Remove from session tracking
-        if file_id in session_files:
-            del session_files[file_id]
-            print(f"[INFO] File removed from session: {file_id}")
+        session_id = request.args.get("thread_id") or DEFAULT_SESSION
+        if file_registry.remove(session_id, file_id):
+            client.files.delete(file_id)
+            log.info("File deleted from OpenAI: %s", file_id)
+        else:
+            log.info("File removed from session %s: %s", session_id, file_id)
         
         return jsonify({"success": True})
     except Exception as e:
-        print(f"[ERROR] Delete file failed: {e}")
+        log.error("Delete file failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def calendar_response(args):
+    """(body, status) for /api/rules/calendar query params."""
+    if not args.get("canton"):
+        return {"error": "canton is required"}, 400
+    try:
+        result = calendar_for(
+            args["canton"],
+            species=args.get("species", ""),
+            date_from=args.get("from") or None,
+            date_to=args.get("to") or None,
+            days=args.get("days", "1") != "0",
+        )
+    except ValueError as e:
+        return {"error": f"invalid date: {e}"}, 400
+    if result.get("error") == "unknown_canton":
+        return result, 404
+    return result, 400 if "error" in result else 200
+
+@app.route("/api/rules/calendar", methods=["GET"])
+def rules_calendar_endpoint():
+    """
+    Season calendar of a canton in one call.
+    Query params: canton, species (comma-separated, default all), from, to
+    (ISO dates, default the current year), days=0 to omit per-day states.
+    """
+    body, status = calendar_response(request.args)
+    return jsonify(body), status
+
+def conditions_request(body):
+    """(spots, language, error) from a /api/conditions JSON body."""
+    spots = (body or {}).get("spots")
+    if not isinstance(spots, list) or not spots:
+        return None, None, "spots must be a non-empty list"
+    if len(spots) > MAX_SPOTS:
+        return None, None, f"at most {MAX_SPOTS} spots per request"
+    return spots, (body or {}).get("language") or "de", None
+
+@app.route("/api/conditions", methods=["POST"])
+def conditions_endpoint():
+    """
+    Current weather and water data for many spots, streamed as NDJSON in
+    completion order. Body: {"spots": ["Bern", {"id", "lat", "lon"}, ...],
+    "language"}; each line carries the spot's request "index".
+    """
+    spots, language, error = conditions_request(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    def lines():
+        for row in conditions(spots, language=language):
+            yield json.dumps(row) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/", methods=["GET"])
 def health():
     """Health check endpoint."""
     return jsonify({"status": "ok", "message": "FishBuddy backend is running"})
 
 if __name__ == "__main__":
-    print("[INFO] Starting FishBuddy Flask backend...")
-    print("[INFO] CORS enabled for http://localhost:5173")
+    log.info("Starting FishBuddy Flask backend...")
+    log.info("CORS enabled for http://localhost:5173")
     app.run(debug=True, host="0.0.0.0", port=5000, use_reloader=False)
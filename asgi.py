@@ -0,0 +1,394 @@
+# asgi.py
+"""
+Async serving mode for the FishBuddy backend.
+
+Serves the same /api routes as app.py on Quart with the AsyncOpenAI client,
+so an open /api/chat stream is a coroutine waiting on the OpenAI event
+stream rather than a worker thread. Run with any ASGI server, e.g.:
+
+    hypercorn asgi:app --bind 0.0.0.0:5000
+
+The Flask entry point (python app.py) remains available.
+"""
+import asyncio
+import functools
+import json
+import weakref
+import logging
+import os
+import time
+import uuid
+
+from openai import AsyncOpenAI
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+
+from app import (
+    api_key, assistant_id, file_registry, sweep_files,
+    ToolCall, tool_executor, TOOL_TIMEOUT, TOOL_BATCH_TIMEOUT, sse_event, record_turn, calendar_response,
+    conditions_request, thread_context, observe_usage,
+)
+from services import metrics
+from services.answers import answer_cache, ENABLED as ANSWER_CACHE_ENABLED
+from services.conditions import conditions
+from services.registry import DEFAULT_SESSION
+from services.singleflight import AsyncSingleFlight
+from services.uploads import sha256_stream
+
+log = logging.getLogger("fishbuddy.asgi")
+
+app = cors(Quart(__name__))
+aclient = AsyncOpenAI(api_key=api_key)
+
+# Each idle stream costs a coroutine and its buffers, so this is sized by
+# memory rather than by thread count.
+MAX_STREAMS = int(os.getenv("MAX_CONCURRENT_STREAMS", "2000"))
+active_streams = 0
+metrics.gauge("fishbuddy_active_streams", "Open /api/chat streams.", (), lambda: {(): active_streams})
+
+# Threads with an open chat stream in this process
+_live_threads = set()
+
+class StreamSlot:
+    """
+    One of MAX_STREAMS plus a claim on the thread, taken before any awaits
+    so bursts can't overshoot the limit or post to one thread twice.
+    """
+
+    def __init__(self, thread_id):
+        global active_streams
+        active_streams += 1
+        _live_threads.add(thread_id)
+        self.thread_id = thread_id
+        self.held = True
+
+    def release(self):
+        global active_streams
+        if self.held:
+            self.held = False
+            active_streams -= 1
+            _live_threads.discard(self.thread_id)
+
+async def registry_call(fn, *args, **kwargs):
+    """Run a (possibly SQLite-backed) file registry call off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+# Identical tool calls from concurrent streams share one executor job
+_tool_flight = AsyncSingleFlight("tool")
+
+def _tool_key(name, arguments):
+    try:
+        return name, json.dumps(json.loads(arguments or "{}"), sort_keys=True)
+    except ValueError:
+        return name, arguments
+
+async def execute_tool_calls(tool_calls, timeout=None):
+    """
+    Async counterpart of app.execute_tool_calls. Tool functions stay
+    synchronous and run on the shared bounded tool pool; outputs keep the
+    order of `tool_calls`. Each call's timeout starts when it begins
+    running; calls still queued TOOL_BATCH_TIMEOUT after the batch was
+    submitted are cancelled. A call identical to one already running (same tool, same
+    arguments) awaits that one instead of taking a pool slot.
+    """
+    timeout = TOOL_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + TOOL_BATCH_TIMEOUT
+
+    async def run(call):
+        tc = ToolCall(call, deadline)
+        queued = asyncio.wrap_future(tc.started)
+        try:
+            started = await asyncio.wait_for(asyncio.shield(queued), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if tc.expire():
+                name = call.function.name
+                metrics.TOOL_ERRORS.inc(name, "queue_timeout")
+                log.error("Tool %s timed out (queue_timeout)", name)
+                return json.dumps({"error": f"tool_timeout: {name}"})
+            started = await queued  # picked up just now
+        remaining = max(0.0, tc.until(started, timeout) - time.monotonic())
+        return await asyncio.wait_for(asyncio.wrap_future(tc.future), remaining)
+
+    async def one(call):
+        name = call.function.name
+        try:
+            out = await _tool_flight.do(_tool_key(name, call.function.arguments), run, call)
+        except asyncio.TimeoutError:
+            metrics.TOOL_ERRORS.inc(name, "timeout")
+            log.error("Tool %s timed out (timeout)", name)
+            out = json.dumps({"error": f"tool_timeout: {name}"})
+        return {"tool_call_id": call.id, "output": out}
+
+    return await asyncio.gather(*(one(call) for call in tool_calls))
+
+async def relay_run_events(thread_id, stream, answer=None):
+    """
+    Yield SSE frames for a streamed run, resolving tool calls inline.
+    Text deltas are collected into `answer` when given; a failed run
+    appends None.
+    """
+    while stream is not None:
+        current, stream = stream, None
+        async with current:
+            async for event in current:
+                kind = event.event
+
+                if kind == "thread.message.delta":
+                    for part in event.data.delta.content or []:
+                        text = getattr(part, "text", None)
+                        if part.type == "text" and text and text.value:
+                            if answer is not None:
+                                answer.append(text.value)
+                            yield sse_event({"text": text.value})
+
+                elif kind == "thread.run.requires_action":
+                    run = event.data
+                    outs = await execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+                    with metrics.openai_call("runs.submit_tool_outputs"):
+                        stream = await aclient.beta.threads.runs.submit_tool_outputs(
+                            thread_id=thread_id,
+                            run_id=run.id,
+                            tool_outputs=outs,
+                            stream=True,
+                        )
+                    break
+
+                elif kind == "thread.run.completed":
+                    observe_usage(event.data)
+
+                elif kind in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+                    run = event.data
+                    error = getattr(run, "last_error", None)
+                    if answer is not None:
+                        answer.append(None)
+                    yield sse_event({"error": getattr(error, "message", None) or f"run_{run.status}"})
+
+                elif kind == "error":
+                    if answer is not None:
+                        answer.append(None)
+                    yield sse_event({"error": getattr(event.data, "message", None) or "stream_error"})
+
+@app.route("/api/thread", methods=["POST"])
+async def create_thread():
+    """Create a new thread for this session."""
+    try:
+        with metrics.openai_call("threads.create"):
+            thread = await aclient.beta.threads.create()
+        return jsonify({"thread_id": thread.id})
+    except Exception as e:
+        log.error("Failed to create thread: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/chat", methods=["GET"])
+async def chat():
+    """
+    Stream assistant response using Server-Sent Events.
+    Query params: thread_id, message, context
+    """
+    started = time.perf_counter()
+    slot, handed_off = None, False
+    try:
+        thread_id = request.args.get("thread_id")
+        message = request.args.get("message")
+        context_str = request.args.get("context", "{}")
+
+        if not thread_id or not message:
+            return jsonify({"error": "Missing thread_id or message"}), 400
+        # Runs aren't buffered here, so an EventSource reconnect can't be
+        # resumed; end it rather than posting the message a second time
+        if request.headers.get("Last-Event-ID"):
+            return Response(
+                sse_event({"error": "stream_interrupted"}) + sse_event({"done": True}),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        if thread_id in _live_threads:
+            return jsonify({"error": "A run is already in progress for this thread"}), 409
+        if active_streams >= MAX_STREAMS:
+            return jsonify({"error": "Too many concurrent chats, retry shortly"}), 503
+        slot = StreamSlot(thread_id)
+
+        try:
+            context = json.loads(context_str)
+        except ValueError:
+            context = {}
+
+        answer_key = answer_cache.key(message, context) if ANSWER_CACHE_ENABLED else None
+        if answer_key is not None:
+            cached = answer_cache.get(answer_key)
+            if cached is not None:
+                asyncio.get_running_loop().run_in_executor(None, record_turn, thread_id, context, message, cached)
+                metrics.CHAT_TTFB.observe(time.perf_counter() - started)
+                metrics.CHAT_SECONDS.observe(time.perf_counter() - started, "cached")
+                return Response(
+                    sse_event({"text": cached}) + sse_event({"done": True}),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                )
+
+        posted, mode = thread_context.compose(thread_id, context, message)
+        with metrics.openai_call("messages.create"):
+            await aclient.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=posted,
+            )
+        thread_context.commit(thread_id, context, mode)
+        with metrics.openai_call("runs.create"):
+            stream = await aclient.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                stream=True,
+                **thread_context.run_options(thread_id),
+            )
+
+        async def stream_response():
+            outcome, first = "ok", True
+            # Ids make a reconnecting EventSource send Last-Event-ID
+            stream_id, seq = uuid.uuid4().hex[:16], 0
+            answer = [] if answer_key is not None else None
+            try:
+                async for frame in relay_run_events(thread_id, stream, answer):
+                    if first:
+                        metrics.CHAT_TTFB.observe(time.perf_counter() - started)
+                        first = False
+                    if frame.startswith('data: {"error"'):
+                        outcome = "error"
+                    seq += 1
+                    yield f"id: {stream_id}.{seq}\n{frame}"
+                if answer and None not in answer:
+                    answer_cache.put(answer_key, "".join(answer))
+            except asyncio.CancelledError:
+                outcome = "disconnected"
+                raise
+            except Exception as e:
+                outcome = "error"
+                log.error("Stream failed: %s", e)
+                yield sse_event({"error": str(e)})
+            finally:
+                slot.release()
+                metrics.CHAT_SECONDS.observe(time.perf_counter() - started, outcome)
+
+            yield sse_event({"done": True})
+
+        body = stream_response()
+        # The stream releases the slot when it ends; this covers a body never iterated
+        weakref.finalize(body, slot.release)
+        response = Response(
+            body,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.timeout = None  # streams may outlive Quart's default response timeout
+        handed_off = True  # the stream owns the slot now
+        return response
+
+    except Exception as e:
+        log.error("Chat endpoint failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if slot is not None and not handed_off:
+            slot.release()
+
+@app.route("/api/upload", methods=["POST"])
+async def upload_file():
+    """Upload a file to OpenAI and register it for the caller's thread."""
+    try:
+        files = await request.files
+        if "file" not in files:
+            return jsonify({"error": "No file provided"}), 400
+
+        form = await request.form
+        file = files["file"]
+        filename = file.filename
+        session_id = form.get("thread_id") or DEFAULT_SESSION
+        sweep_files()
+
+        # Hash the spooled upload off the event loop, then stream it
+        loop = asyncio.get_running_loop()
+        sha256, size = await loop.run_in_executor(None, sha256_stream, file.stream)
+        known = await registry_call(file_registry.find_content, sha256)
+        if known is not None:
+            await registry_call(file_registry.add, session_id, known["file_id"], filename, sha256=sha256, size=size)
+            return jsonify({"file_id": known["file_id"], "filename": filename, "status": "duplicate"})
+
+        with metrics.openai_call("files.create"):
+            file_response = await aclient.files.create(
+                file=(filename, file.stream),
+                purpose="assistants"
+            )
+        file_id = file_response.id
+
+        try:
+            await aclient.beta.assistants.update(
+                assistant_id=assistant_id,
+                file_ids=[file_id]
+            )
+        except Exception as e:
+            log.warning("Could not attach file to assistant: %s", e)
+
+        await registry_call(file_registry.add, session_id, file_id, filename, sha256=sha256, size=size)
+        await registry_call(file_registry.add_content, sha256, file_id, size)
+        return jsonify({"file_id": file_id, "filename": filename, "status": "uploaded"})
+
+    except Exception as e:
+        log.error("Upload failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/files", methods=["GET"])
+async def list_files():
+    """List files uploaded in the caller's thread only."""
+    sweep_files()
+    session_id = request.args.get("thread_id") or DEFAULT_SESSION
+    files_list = [
+        {"id": f["id"], "filename": f["filename"]}
+        for f in await registry_call(file_registry.list, session_id)
+    ]
+    return jsonify({"files": files_list})
+
+@app.route("/api/files/<file_id>", methods=["DELETE"])
+async def delete_file(file_id):
+    """Remove a file from the caller's thread; delete it from OpenAI once no thread uses it."""
+    try:
+        session_id = request.args.get("thread_id") or DEFAULT_SESSION
+        if await registry_call(file_registry.remove, session_id, file_id):
+            await aclient.files.delete(file_id)
+        return jsonify({"success": True})
+    except Exception as e:
+        log.error("Delete file failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/rules/calendar", methods=["GET"])
+async def rules_calendar_endpoint():
+    """Season calendar of a canton in one call; see app.rules_calendar_endpoint."""
+    body, status = calendar_response(request.args)
+    return jsonify(body), status
+
+@app.route("/api/conditions", methods=["POST"])
+async def conditions_endpoint():
+    """Bulk spot conditions as NDJSON; see app.conditions_endpoint."""
+    spots, language, error = conditions_request(await request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    async def lines():
+        # The fetches block, so the generator is advanced on the tool pool
+        loop = asyncio.get_running_loop()
+        rows = conditions(spots, language=language)
+        while True:
+            row = await loop.run_in_executor(tool_executor, next, rows, None)
+            if row is None:
+                return
+            yield json.dumps(row) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/", methods=["GET"])
+async def health():
+    """Health check endpoint."""
+    return jsonify({"status": "ok", "message": "FishBuddy backend is running (async)"})
@@ -0,0 +1 @@
+__all__ = []  # makes services a regular package for imports
@@ -0,0 +1,297 @@
+# bench/fakes.py
+"""
+Local stand-ins for every upstream FishBuddy talks to: Open-Meteo
+(geocoding + forecast), GBIF, the hydro proxy and the OpenAI Assistants
+API. Each runs on its own port so per-host connection pooling behaves as
+it does in production; responses are deterministic and delays are
+configurable per server.
+"""
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+def _unit(text: str) -> float:
+    """Deterministic value in [0, 1) derived from `text`."""
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) / 2**32
+
+class FakeServer:
+    """
+    Threaded HTTP server dispatching to `self.handle(method, path, query, body)`,
+    which returns (status, payload) for JSON or (status, iterator) for SSE.
+    `delay` seconds (+/- `jitter`) are slept before every response.
+    """
+
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0):
+        self.delay = delay
+        self.jitter = jitter
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                server.requests += 1
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw and "json" in (self.headers.get("Content-Type") or "") else {}
+                except ValueError:
+                    body = {}
+                server.sleep()
+                status, payload = server.handle(method, parts.path, parse_qs(parts.query), body)
+
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for chunk in payload:
+                    self.wfile.write(chunk.encode("utf-8"))
+                    self.wfile.flush()
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def sleep(self, delay: float = None):
+        delay = self.delay if delay is None else delay
+        if self.jitter:
+            delay = max(0.0, delay + random.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, method, path, query, body):
+        return 404, {"error": f"no route for {method} {path}"}
+
+class FakeGeocoder(FakeServer):
+    """Open-Meteo geocoding: any name resolves to a stable point in Switzerland."""
+
+    def handle(self, method, path, query, body):
+        name = query.get("name", [""])[0]
+        u = _unit(name.casefold())
+        return 200, {"results": [{
+            "name": name,
+            "latitude": round(45.9 + 1.8 * u, 4),
+            "longitude": round(6.1 + 4.2 * _unit(name[::-1].casefold()), 4),
+            "country": "Schweiz",
+            "admin1": "Zürich",
+        }]}
+
+class FakeForecast(FakeServer):
+    """Open-Meteo forecast: `current` block, one object per comma-separated coordinate."""
+
+    def handle(self, method, path, query, body):
+        lats = query.get("latitude", ["0"])[0].split(",")
+        lons = query.get("longitude", ["0"])[0].split(",")
+        results = []
+        for lat, lon in zip(lats, lons):
+            u = _unit(f"{lat},{lon}")
+            results.append({
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "current": {
+                    "temperature_2m": round(5 + 15 * u, 1),
+                    "wind_speed_10m": round(10 * u, 1),
+                    "precipitation": 0.0,
+                },
+            })
+        return 200, results[0] if len(results) == 1 else results
+
+class FakeGBIF(FakeServer):
+    """GBIF occurrence facets and species name lookups."""
+
+    SPECIES = ["Esox lucius", "Perca fluviatilis", "Salmo trutta", "Thymallus thymallus",
+               "Coregonus lavaretus", "Rutilus rutilus", "Cyprinus carpio", "Lota lota"]
+
+    def handle(self, method, path, query, body):
+        if path.startswith("/v1/species/"):
+            key = path.rsplit("/", 1)[-1]
+            name = self.SPECIES[int(key) % len(self.SPECIES)]
+            return 200, {"key": int(key), "species": name, "scientificName": f"{name} L."}
+        if path == "/v1/occurrence/search":
+            u = _unit(query.get("geometry", [""])[0])
+            counts = [{"name": str(1000 + i), "count": int(500 * u / (i + 1)) + 1} for i in range(len(self.SPECIES))]
+            records = sum(c["count"] for c in counts)
+            if query.get("facet"):
+                return 200, {"count": records, "results": [], "facets": [{"field": "SPECIES_KEY", "counts": counts}]}
+            limit = int(query.get("limit", ["20"])[0])
+            return 200, {"count": records, "results": [
+                {"species": self.SPECIES[i % len(self.SPECIES)], "scientificName": self.SPECIES[i % len(self.SPECIES)] + " L."}
+                for i in range(min(limit, records))
+            ]}
+        return super().handle(method, path, query, body)
+
+class FakeHydro(FakeServer):
+    """Hydro proxy: a grid of stations across Switzerland and their latest readings."""
+
+    def __init__(self, stations: int = 250, **kwargs):
+        super().__init__(**kwargs)
+        side = max(1, int(stations ** 0.5))
+        self.stations = [
+            {"id": str(2000 + i), "name": f"Station {2000 + i}",
+             "lat": round(45.85 + 1.95 * (i // side) / side, 4),
+             "lon": round(6.0 + 4.4 * (i % side) / side, 4)}
+            for i in range(stations)
+        ]
+
+    def handle(self, method, path, query, body):
+        tail = path.rsplit("/", 1)[-1]
+        if tail == "locations":
+            return 200, self.stations
+        u = _unit(tail)
+        return 200, {"water_temp_c": round(4 + 16 * u, 1), "discharge_m3s": round(5 + 300 * u, 1)}
+
+class FakeAssistants(FakeServer):
+    """
+    Minimal OpenAI Assistants API. Every run first goes to `requires_action`
+    with `tool_calls` for `tool_rounds` rounds, then streams `tokens` text
+    deltas. `think_delay` is slept before each run segment and `token_delay`
+    between deltas; both the streamed and the polling flows are supported.
+    """
+
+    def __init__(self, tool_calls=None, tool_rounds: int = 1, tokens: int = 40,
+                 think_delay: float = 0.3, token_delay: float = 0.01, **kwargs):
+        super().__init__(**kwargs)
+        self.tool_calls = tool_calls or [
+            ("get_weather_by_place", {"name": "Zugersee"}),
+            ("get_water_data", {"name": "Zugersee"}),
+            ("list_species_by_place", {"name": "Zugersee"}),
+        ]
+        self.tool_rounds = tool_rounds
+        self.tokens = tokens
+        self.think_delay = think_delay
+        self.token_delay = token_delay
+        self.ids = itertools.count(1)
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def _id(self, prefix: str) -> str:
+        with self.lock:
+            return f"{prefix}_{next(self.ids)}"
+
+    def _run(self, thread_id: str, run_id: str, status: str) -> dict:
+        run = {
+            "id": run_id, "object": "thread.run", "thread_id": thread_id,
+            "assistant_id": "asst_bench", "status": status, "created_at": int(time.time()),
+            "model": "bench", "instructions": "", "tools": [], "metadata": {},
+            "parallel_tool_calls": True,
+        }
+        if status == "requires_action":
+            run["required_action"] = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": [
+                {"id": self._id("call"), "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(args)}}
+                for name, args in self.tool_calls
+            ]}}
+        return run
+
+    def _state(self, thread_id: str, run_id: str, consume: bool = False) -> dict:
+        """Current run; `consume` marks one round of tool outputs as submitted."""
+        with self.lock:
+            if consume:
+                self.runs[run_id] = self.runs.get(run_id, 0) - 1
+            left = self.runs.get(run_id, 0)
+        return self._run(thread_id, run_id, "requires_action" if left > 0 else "completed")
+
+    def _events(self, thread_id: str, run: dict, created: bool):
+        def frame(event, data):
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+        if created:
+            yield frame("thread.run.created", {**run, "status": "queued"})
+        self.sleep(self.think_delay)
+        if run["status"] == "requires_action":
+            yield frame("thread.run.requires_action", run)
+        else:
+            msg_id = self._id("msg")
+            for i in range(self.tokens):
+                yield frame("thread.message.delta", {
+                    "id": msg_id, "object": "thread.message.delta",
+                    "delta": {"content": [{"index": 0, "type": "text", "text": {"value": f"tok{i} "}}]},
+                })
+                self.sleep(self.token_delay)
+            yield frame("thread.run.completed", run)
+        yield "event: done\ndata: [DONE]\n\n"
+
+    def handle(self, method, path, query, body):
+        parts = path.strip("/").split("/")  # v1/threads/{tid}/runs/{rid}/...
+        now = int(time.time())
+
+        if parts[:2] == ["v1", "files"]:
+            if method == "POST":
+                return 200, {"id": self._id("file"), "object": "file", "bytes": 0, "created_at": now,
+                             "filename": "upload", "purpose": "assistants", "status": "processed"}
+            if method == "DELETE" and len(parts) == 3:
+                return 200, {"id": parts[2], "object": "file", "deleted": True}
+
+        if parts[:2] == ["v1", "threads"] and len(parts) == 2 and method == "POST":
+            return 200, {"id": self._id("thread"), "object": "thread", "created_at": now, "metadata": {}}
+
+        if len(parts) >= 4 and parts[3] == "messages":
+            tid = parts[2]
+            if method == "POST":
+                return 200, {"id": self._id("msg"), "object": "thread.message", "thread_id": tid,
+                             "role": body.get("role", "user"), "created_at": now, "status": "completed",
+                             "content": [{"type": "text", "text": {"value": str(body.get("content", "")), "annotations": []}}],
+                             "attachments": [], "metadata": {}}
+            return 200, {"object": "list", "data": [], "has_more": False}
+
+        if len(parts) >= 4 and parts[3] == "runs":
+            tid = parts[2]
+            if len(parts) == 4 and method == "POST":
+                rid = self._id("run")
+                with self.lock:
+                    self.runs[rid] = self.tool_rounds
+                if body.get("stream"):
+                    return 200, self._events(tid, self._state(tid, rid), created=True)
+                return 200, self._run(tid, rid, "queued")
+            rid = parts[4]
+            if len(parts) == 5 and method == "GET":
+                return 200, self._state(tid, rid)
+            if len(parts) == 6 and parts[5] == "submit_tool_outputs":
+                run = self._state(tid, rid, consume=True)
+                if body.get("stream"):
+                    return 200, self._events(tid, run, created=False)
+                return 200, self._run(tid, rid, "queued")
+
+        return super().handle(method, path, query, body)
@@ -0,0 +1,216 @@
+# bench/run.py
+"""
+Offline end-to-end benchmark for FishBuddy.
+
+Starts the local stand-ins from bench/fakes.py, points the backend at them
+through its environment variables and measures the services layer, a
+streamed run with its tool rounds (run_payloads) and the /api/chat
+endpoint at several concurrency levels. Nothing leaves the machine.
+
+    python -m bench.run
+    python -m bench.run --scenarios chat --concurrency 1,16,64 --requests 200
+    python -m bench.run --upstream-delay 0.08 --think-delay 0.5 --json
+
+Reports p50/p95/p99 latency, time to first SSE event (chat) and
+requests/sec per scenario and concurrency level.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from .fakes import FakeAssistants, FakeForecast, FakeGBIF, FakeGeocoder, FakeHydro
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of `values` (unsorted)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def start_fakes(args) -> dict:
+    fakes = {
+        "geocode": FakeGeocoder(delay=args.upstream_delay, jitter=args.jitter),
+        "forecast": FakeForecast(delay=args.upstream_delay, jitter=args.jitter),
+        "gbif": FakeGBIF(delay=args.upstream_delay, jitter=args.jitter),
+        "hydro": FakeHydro(stations=args.stations, delay=args.upstream_delay, jitter=args.jitter),
+        "openai": FakeAssistants(
+            tool_rounds=args.tool_rounds, tokens=args.tokens,
+            think_delay=args.think_delay, token_delay=args.token_delay,
+            delay=args.api_delay,
+        ),
+    }
+    for fake in fakes.values():
+        fake.start()
+
+    # Must be in place before app/services are imported
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-bench",
+        "ASSISTANT_ID": "asst_bench",
+        "OPENAI_BASE_URL": fakes["openai"].url + "/v1",
+        "OPEN_METEO_GEOCODE_URL": fakes["geocode"].url + "/v1/search",
+        "OPEN_METEO_FORECAST_URL": fakes["forecast"].url + "/v1/forecast",
+        "GBIF_API_BASE": fakes["gbif"].url + "/v1",
+        "FOEN_PROXY_BASE": fakes["hydro"].url + "/hydro",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return fakes
+
+def measure(fn, concurrency: int, total: int) -> dict:
+    """Run `fn(i)` `total` times on `concurrency` threads; fn returns an optional TTFE."""
+    latencies, ttfes, errors = [], [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ttfe = fn(i)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if ttfe is not None:
+                ttfes.append(ttfe)
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall
+
+    ms = lambda v: round(v * 1000, 2)
+    result = {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+    if ttfes:
+        result["ttfe_p50_ms"] = ms(percentile(ttfes, 50))
+        result["ttfe_p95_ms"] = ms(percentile(ttfes, 95))
+    return result
+
+def service_scenarios(places: list) -> dict:
+    import tools
+
+    pick = lambda i: places[i % len(places)]
+    return {
+        "geocode_place": lambda i: tools.geocode_place(pick(i)) and None,
+        "get_weather_by_place": lambda i: tools.get_weather_by_place(pick(i)) and None,
+        "get_water_data": lambda i: tools.get_water_data(pick(i)) and None,
+        "list_species_by_place": lambda i: tools.list_species_by_place(pick(i)) and None,
+        "check_rules": lambda i: tools.check_rules("zh", "pike") and None,
+        "get_spot_report": lambda i: tools.get_spot_report(pick(i)) and None,
+    }
+
+def dispatch_scenario():
+    import app
+
+    def one(i):
+        thread = app.client.beta.threads.create()
+        stream = app.client.beta.threads.runs.create(thread_id=thread.id, assistant_id=app.assistant_id, stream=True)
+        for _ in app.run_payloads(thread.id, stream):
+            pass
+
+    return one
+
+def chat_scenario(places: list):
+    import requests
+    from werkzeug.serving import make_server
+    import app
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    session = requests.Session()
+
+    def one(i):
+        thread_id = session.post(f"{base}/api/thread").json()["thread_id"]
+        params = {
+            "thread_id": thread_id,
+            "message": f"Can I fish near {places[i % len(places)]} today?",
+            "context": json.dumps({"canton": "ZH", "level": "Beginner"}),
+        }
+        started = time.perf_counter()
+        ttfe = None
+        with session.get(f"{base}/api/chat", params=params, stream=True, timeout=120) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                if ttfe is None:
+                    ttfe = time.perf_counter() - started
+                if b'"done"' in line:
+                    break
+                if b'"error"' in line:
+                    raise RuntimeError(line.decode())
+        return ttfe
+
+    return one
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="services,dispatch,chat",
+                        help="comma-separated subset of services,dispatch,chat")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and level")
+    parser.add_argument("--places", type=int, default=20, help="distinct place names to rotate through")
+    parser.add_argument("--upstream-delay", type=float, default=0.05, help="seconds per Open-Meteo/GBIF/hydro response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="+/- seconds added to upstream delays")
+    parser.add_argument("--api-delay", type=float, default=0.02, help="seconds per fake OpenAI response")
+    parser.add_argument("--think-delay", type=float, default=0.3, help="seconds before each run segment")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between text deltas")
+    parser.add_argument("--tokens", type=int, default=40, help="text deltas per answer")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="requires_action rounds per run")
+    parser.add_argument("--stations", type=int, default=250, help="fake hydro stations")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args(argv)
+
+    fakes = start_fakes(args)
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    scenarios = set(args.scenarios.split(","))
+    # Names outside the bundled gazetteer so geocoding exercises the remote path
+    places = [f"Bench Spot {i}" for i in range(args.places)]
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    plan = []
+    if "services" in scenarios:
+        plan += list(service_scenarios(places).items())
+    if "dispatch" in scenarios:
+        plan.append(("run_payloads", dispatch_scenario()))
+    if "chat" in scenarios:
+        plan.append(("/api/chat", chat_scenario(places)))
+
+    if not args.json:
+        print(f"{'scenario':<24}{'conc':>6}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfe p50':>10}{'rps':>9}")
+    for name, fn in plan:
+        for level in levels:
+            result = {"scenario": name, **measure(fn, level, args.requests)}
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{name:<24}{level:>6}{result['requests']:>6}{result['errors']:>5}"
+                      f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+                      f"{result.get('ttfe_p50_ms', '-'):>10}{result['rps']:>9}")
+            sys.stdout.flush()
+
+    upstream = {k: f.requests for k, f in fakes.items()}
+    print(json.dumps({"upstream_requests": upstream}) if args.json else f"\nupstream requests: {upstream}")
+    for fake in fakes.values():
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -33,11 +33,12 @@ function App() {
   }, [messages]);
 
   useEffect(() => {
-    fetch("http://localhost:5000/api/files")
+    if (!threadId) return;
+    fetch(`http://localhost:5000/api/files?thread_id=${encodeURIComponent(threadId)}`)
       .then(r => r.json())
       .then(d => setAttachedFiles(d.files || []))
       .catch(e => console.error("Failed to load files:", e));
-  }, []);
+  }, [threadId]);
 
   // Auto-resize textarea smoothly
   const handleInputChange = (e) => {
@@ -96,13 +97,32 @@ function App() {
       let assistantText = "";
       let assistantMsgAdded = false;
 
+      // Shows an error in the assistant bubble, after any text already streamed
+      const showError = (message) => {
+        const notice = `⚠️ ${message}`;
+        setMessages(prev => {
+          const copy = [...prev];
+          const last = copy[copy.length - 1];
+          if (last?.role === "assistant") {
+            copy[copy.length - 1] = { ...last, text: last.text ? `${last.text}\n\n${notice}` : notice, error: true };
+          } else {
+            copy.push({ role: "assistant", text: notice, error: true });
+          }
+          return copy;
+        });
+      };
+
       eventSource.onmessage = (event) => {
         const data = JSON.parse(event.data);
         if (data.done) {
           eventSource.close();
           setLoading(false);
-        } else if (data.text) {
-          assistantText += data.text + "\n";
+        } else if (data.error) {
+          console.error("Run error:", data.error);
+          showError(data.error);
+        } else if (data.replace !== undefined || data.text) {
+          // "replace" resyncs the whole answer after a reconnect that missed frames
+          assistantText = data.replace !== undefined ? data.replace + (data.text || "") : assistantText + data.text;
           setMessages(prev => {
             const copy = [...prev];
             if (copy[copy.length - 1]?.role === "assistant" && copy[copy.length - 1]?.text === "") {
@@ -120,9 +140,13 @@ function App() {
       };
 
       eventSource.onerror = (err) => {
-        console.error("Stream error:", err);
-        eventSource.close();
-        setLoading(false);
+        // While the connection is retrying, the browser reconnects with
+        // Last-Event-ID and the backend resumes the same run.
+        if (eventSource.readyState === EventSource.CLOSED) {
+          console.error("Stream error:", err);
+          showError("The answer could not be loaded. Please try again.");
+          setLoading(false);
+        }
       };
 
       setMessages(prev => [...prev, { role: "assistant", text: "" }]);
@@ -139,6 +163,7 @@ function App() {
     setUploading(true);
     const formData = new FormData();
     formData.append("file", file);
+    if (threadId) formData.append("thread_id", threadId);
 
     try {
       console.log(`[INFO] Uploading file: ${file.name}`);
@@ -168,7 +193,8 @@ function App() {
 
   const handleDeleteFile = async (fileId) => {
     try {
-      await fetch(`http://localhost:5000/api/files/${fileId}`, { method: "DELETE" });
+      const query = threadId ? `?thread_id=${encodeURIComponent(threadId)}` : "";
+      await fetch(`http://localhost:5000/api/files/${fileId}${query}`, { method: "DELETE" });
       setAttachedFiles(prev => prev.filter(f => f.id !== fileId));
       setMessageFiles(prev => prev.filter(f => f.id !== fileId));
     } catch (err) {
@@ -192,7 +218,7 @@ function App() {
             messages.map((msg, i) => (
               msg.text || msg.role === "user" ? (
                 <div key={i} className={`message ${msg.role}`}>
-                  <div className={`message-bubble ${msg.role}`}>
+                  <div className={`message-bubble ${msg.role}${msg.error ? " error" : ""}`}>
                     {msg.text}
                     {msg.files && msg.files.length > 0 && (
                       <div className="message-files">
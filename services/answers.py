@@ -0,0 +1,74 @@
+# services/answers.py
+import json
+import os
+import threading
+import unicodedata
+from datetime import date
+
+from .cache import TTLCache
+from .metrics import register_cache
+from .rules import rules_version
+
+# Opt-in: a cached answer ignores earlier turns of the thread, so only
+# enable this where questions are answered from the structured context.
+ENABLED = os.environ.get("ANSWER_CACHE", "0") == "1"
+TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1024"))
+
+def _normalize(text: str) -> str:
+    """
+    Case-folded words of `text` joined by single spaces. Letters, marks and
+    digits of every script are kept; whitespace and punctuation only separate
+    words ("Hecht  fangen?" -> "hecht fangen", "Щука?" -> "щука").
+    """
+    s = unicodedata.normalize("NFKC", text or "").casefold()
+    s = "".join(c if unicodedata.category(c)[0] in "LMN" else " " for c in s)
+    return " ".join(s.split())
+
+def _context_key(context) -> str:
+    if not isinstance(context, dict):
+        return ""
+    kept = {k: _normalize(str(v)) for k, v in context.items() if v not in (None, "")}
+    return json.dumps(kept, sort_keys=True)
+
+class AnswerCache:
+    """
+    Final assistant answers keyed by normalized question, structured
+    context and day. Entries are LRU/TTL-evicted and the whole cache is
+    dropped when the rules file is reloaded, since answers quote it.
+    """
+
+    def __init__(self, maxsize: int = SIZE, ttl: float = TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def key(self, message: str, context) -> tuple:
+        """Cache key of a question, or None if nothing of it is left to key on."""
+        question = _normalize(message)
+        if not question:
+            return None
+        return (question, _context_key(context), date.today().isoformat())
+
+    def _check_version(self):
+        version = rules_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._cache.clear()
+
+    def get(self, key: tuple) -> str:
+        self._check_version()
+        return self._cache.get(key)
+
+    def put(self, key: tuple, answer: str):
+        if not answer:
+            return
+        self._check_version()
+        self._cache.set(key, answer)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+answer_cache = AnswerCache()
+register_cache("answers", answer_cache.stats)
@@ -0,0 +1,77 @@
+# services/cantons.py
+import json
+import math
+import os
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "cantons.json")
+
+# Side of the bounding-box prefilter grid, in degrees
+CELL_DEG = 0.1
+
+def _in_ring(ring: list, x: float, y: float) -> bool:
+    """Even-odd ray casting; `ring` is a list of [lon, lat] vertices."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+class CantonIndex:
+    """
+    Point-in-polygon canton lookup over the bundled simplified outlines.
+    A coarse grid maps each cell to the polygons whose bounding box
+    overlaps it; only those are bbox-checked and then ray-cast.
+    """
+
+    def __init__(self, cantons: dict, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self._polygons = []  # (code, (min_x, min_y, max_x, max_y), rings)
+        self._grid = {}
+        for code, polygons in cantons.items():
+            for rings in polygons:
+                xs = [p[0] for p in rings[0]]
+                ys = [p[1] for p in rings[0]]
+                bbox = (min(xs), min(ys), max(xs), max(ys))
+                idx = len(self._polygons)
+                self._polygons.append((code, bbox, rings))
+                for i in range(self._cell(bbox[0]), self._cell(bbox[2]) + 1):
+                    for j in range(self._cell(bbox[1]), self._cell(bbox[3]) + 1):
+                        self._grid.setdefault((i, j), []).append(idx)
+
+    def _cell(self, v: float) -> int:
+        return math.floor(v / self.cell_deg)
+
+    def lookup(self, lat: float, lon: float) -> str:
+        """Two-letter canton code containing (lat, lon), or None outside Switzerland."""
+        for idx in self._grid.get((self._cell(lon), self._cell(lat)), ()):
+            code, (x0, y0, x1, y1), rings = self._polygons[idx]
+            if not (x0 <= lon <= x1 and y0 <= lat <= y1):
+                continue
+            if _in_ring(rings[0], lon, lat) and not any(_in_ring(h, lon, lat) for h in rings[1:]):
+                return code
+        return None
+
+    def lookup_many(self, points) -> list:
+        """Canton codes (or None) for an iterable of (lat, lon) pairs."""
+        return [self.lookup(lat, lon) for lat, lon in points]
+
+_canton_index = None
+
+def canton_index() -> CantonIndex:
+    """Load the bundled canton outlines once per process."""
+    global _canton_index
+    if _canton_index is None:
+        cantons = {}
+        if os.path.exists(DATA_PATH):
+            with open(DATA_PATH, "r", encoding="utf-8") as f:
+                cantons = json.load(f).get("cantons", {})
+        _canton_index = CantonIndex(cantons)
+    return _canton_index
+
+def canton_at(lat: float, lon: float) -> str:
+    return canton_index().lookup(lat, lon)
+
+def cantons_at(points) -> list:
+    return canton_index().lookup_many(points)
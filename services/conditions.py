@@ -0,0 +1,146 @@
+# services/conditions.py
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .geocode import geocode_place
+from .hydro import station_registry, station_reading
+from .weather import current_weather_many, BATCH_SIZE
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="conditions")
+
+# Spots accepted per request
+MAX_SPOTS = int(os.environ.get("CONDITIONS_MAX_SPOTS", "200"))
+
+def _parse_spot(item) -> dict:
+    """A place name or {"name"?, "lat", "lon", "id"?}; None if neither."""
+    if isinstance(item, str) and item.strip():
+        return {"name": item.strip()}
+    if isinstance(item, dict):
+        spot = {k: item[k] for k in ("id", "name") if item.get(k) is not None}
+        try:
+            if item.get("lat") is not None and item.get("lon") is not None:
+                spot["lat"], spot["lon"] = float(item["lat"]), float(item["lon"])
+        except (TypeError, ValueError):
+            return None
+        if "lat" in spot or spot.get("name"):
+            return spot
+    return None
+
+def conditions(spots: list, language: str = "de", timeout: float = 10.0):
+    """
+    Current weather and nearest-station water data for many spots,
+    yielded one dict per spot as soon as both parts are in (completion
+    order, not request order). Spots given by coordinates are started
+    right away and geocoded places as their results arrive; weather is
+    fetched BATCH_SIZE locations per Open-Meteo request and each hydro
+    station is read once per batch however many spots share it.
+    Yields {"index", "id"?, "place"?, "lat", "lon", "air_temp_c", "wind_ms",
+    "precip_mm", "station_id", "station_name", "distance_km", "water_temp_c",
+    "discharge_m3s", "data_age_s"}, with "weather_error"/"water_error" for a
+    failed part, or {"index", "error"} if the spot could not be located.
+    "place" is only present for spots given by (or geocoded from) a name.
+    """
+    rows = {}
+    pending = {}
+    geocodes = {}
+    jobs = {}
+
+    def submit(located: list) -> set:
+        """Weather and water jobs for newly located rows."""
+        submitted = set()
+        for i in located:
+            pending[i] = 1
+        for n in range(0, len(located), BATCH_SIZE):
+            chunk = located[n:n + BATCH_SIZE]
+            coords = [(rows[i]["lat"], rows[i]["lon"]) for i in chunk]
+            future = _pool.submit(current_weather_many, coords, timeout=timeout)
+            jobs[future] = ("weather", chunk)
+            submitted.add(future)
+
+        # One pass over the in-memory station index, then one read per station
+        try:
+            registry = station_registry()
+            by_station = {}
+            for i in located:
+                nearest = registry.nearest(rows[i]["lat"], rows[i]["lon"], k=1, timeout=timeout)
+                if not nearest:
+                    rows[i]["water_error"] = "no_station"
+                    continue
+                dist, station = nearest[0]
+                rows[i].update(station_id=station.get("id"), station_name=station.get("name"),
+                               distance_km=round(dist, 1))
+                by_station.setdefault(station["id"], []).append(i)
+                pending[i] += 1
+            for station_id, members in by_station.items():
+                future = _pool.submit(station_reading, station_id, timeout=timeout)
+                jobs[future] = ("water", members)
+                submitted.add(future)
+        except Exception as e:
+            for i in located:
+                rows[i].setdefault("water_error", f"stations_unavailable: {e.__class__.__name__}")
+        return submitted
+
+    for i, item in enumerate(spots):
+        spot = _parse_spot(item)
+        if spot is None:
+            yield {"index": i, "error": "invalid_spot"}
+            continue
+        row = {"index": i}
+        if "id" in spot:
+            row["id"] = spot["id"]
+        if "lat" in spot:
+            if spot.get("name"):
+                row["place"] = spot["name"]
+            row.update(lat=spot["lat"], lon=spot["lon"])
+            rows[i] = row
+        else:
+            geocodes[_pool.submit(geocode_place, spot["name"], language=language, timeout=timeout)] = (row, spot["name"])
+
+    # Coordinate spots don't wait for any geocode
+    waiting = set(geocodes) | submit(sorted(rows))
+
+    while waiting:
+        done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+        located = []
+        for future in done:
+            if future in geocodes:
+                row, name = geocodes.pop(future)
+                try:
+                    g = future.result()
+                except Exception as e:
+                    g = {"error": str(e)}
+                if "error" in g:
+                    yield {**row, "error": "geocode_failed", "place": name}
+                    continue
+                row.update(place=g.get("name") or name, lat=g["lat"], lon=g["lon"])
+                rows[row["index"]] = row
+                located.append(row["index"])
+                continue
+
+            kind, members = jobs.pop(future)
+            try:
+                result = future.result()
+                error = None
+            except Exception as e:
+                result, error = None, f"{kind}_api_error: {e.__class__.__name__}"
+
+            for n, i in enumerate(members):
+                row = rows[i]
+                if error:
+                    row[f"{kind}_error"] = error
+                elif kind == "weather":
+                    current = result[n]
+                    if "error" in current:
+                        row["weather_error"] = current["error"]
+                    else:
+                        row.update(current)
+                else:
+                    reading, age = result
+                    row.update(reading, data_age_s=round(age))
+                pending[i] -= 1
+                if pending[i] == 0:
+                    yield row
+
+        # Geocodes that finished together share their weather batches
+        if located:
+            waiting |= submit(sorted(located))
@@ -0,0 +1,139 @@
+# services/encoding.py
+"""
+Compact serialization of tool results for the model.
+
+Every token of a tool output is read by the model before it answers, so
+results are encoded once, here, rather than by each service:
+nulls and empty values are dropped, floats are rounded to the precision
+that matters for fishing advice, redundant keys are removed and the
+output is kept within a per-tool byte budget by shortening the longest
+lists first.
+"""
+import json
+import os
+
+from .metrics import counter, histogram
+
+# Decimal places per key; other floats get DEFAULT_DECIMALS
+DECIMALS = {
+    "lat": 4, "lon": 4,          # ~10 m
+    "air_temp_c": 1, "water_temp_c": 1,
+    "wind_ms": 1, "precip_mm": 1,
+    "discharge_m3s": 1, "distance_km": 1,
+}
+DEFAULT_DECIMALS = 2
+
+# Keys that restate something the model already has
+REDUNDANT = {"provider", "scientific_name"}
+
+# Species lists become {"name": count} and are capped at this many entries
+SPECIES_LIMIT = int(os.environ.get("TOOL_SPECIES_LIMIT", "10"))
+
+DEFAULT_BUDGET = int(os.environ.get("TOOL_OUTPUT_BUDGET", "1500"))
+BUDGETS = {
+    "get_spot_report": int(os.environ.get("TOOL_OUTPUT_BUDGET_SPOT", "3000")),
+}
+
+# Rough BPE rate for compact JSON; only used for the metrics below
+BYTES_PER_TOKEN = 4
+
+_SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+OUTPUT_BYTES = histogram("fishbuddy_tool_output_bytes", "Tool output size before and after encoding.",
+                         ("tool", "stage"), buckets=_SIZE_BUCKETS)
+OUTPUT_TOKENS = counter("fishbuddy_tool_output_tokens_total", "Estimated model tokens of tool outputs.",
+                        ("tool", "stage"))
+TRUNCATED = counter("fishbuddy_tool_output_truncated_total", "Tool outputs shortened to fit their budget.",
+                    ("tool",))
+
+def _species_map(items: list) -> dict:
+    out = {}
+    for item in items[:SPECIES_LIMIT]:
+        name = item.get("name") or item.get("species")
+        if name is not None and "count" in item:
+            out[name] = item["count"]
+    return out
+
+def compact(value, key: str = None):
+    """Recursively drop empty values and redundant keys and round floats."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in REDUNDANT:
+                continue
+            if k == "species" and isinstance(v, list) and v and isinstance(v[0], dict) and "count" in v[0]:
+                v = _species_map(v)
+            v = compact(v, k)
+            if v is None or v == "" or v == [] or v == {}:
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, list):
+        return [compact(v, key) for v in value]
+    if isinstance(value, float):
+        rounded = round(value, DECIMALS.get(key, DEFAULT_DECIMALS))
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+def _dump(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _longest_list(value, path=()):
+    """(length, path) of the longest list or species map inside `value`."""
+    best = (0, None)
+    if isinstance(value, dict):
+        if path and path[-1] == "species" and len(value) > 1:
+            best = (len(value), path)
+        for k, v in value.items():
+            best = max(best, _longest_list(v, path + (k,)), key=lambda b: b[0])
+    elif isinstance(value, list):
+        if len(value) > 1:
+            best = (len(value), path)
+        for i, v in enumerate(value):
+            best = max(best, _longest_list(v, path + (i,)), key=lambda b: b[0])
+    return best
+
+def _fit(value: dict, budget: int) -> tuple:
+    """Halve the longest collection until the encoding fits; returns (text, truncated)."""
+    text = _dump(value)
+    truncated = False
+    while len(text.encode("utf-8")) > budget:
+        length, path = _longest_list(value)
+        if not path:
+            break
+        parent = value
+        for step in path[:-1]:
+            parent = parent[step]
+        target = parent[path[-1]]
+        keep = length // 2
+        parent[path[-1]] = dict(list(target.items())[:keep]) if isinstance(target, dict) else target[:keep]
+        value["truncated"] = True
+        truncated = True
+        text = _dump(value)
+    return text, truncated
+
+def encode(tool: str, result) -> str:
+    """
+    Encode a tool result (dict, list or an already serialized JSON string)
+    for the model and record raw/encoded sizes per tool.
+    """
+    if isinstance(result, str):
+        raw = result
+        try:
+            result = json.loads(result)
+        except ValueError:
+            return result
+    else:
+        raw = json.dumps(result)
+
+    value = compact(result)
+    if isinstance(value, dict):
+        text, truncated = _fit(value, BUDGETS.get(tool, DEFAULT_BUDGET))
+        if truncated:
+            TRUNCATED.inc(tool)
+    else:
+        text = _dump(value)
+
+    for stage, size in (("raw", len(raw.encode("utf-8"))), ("encoded", len(text.encode("utf-8")))):
+        OUTPUT_BYTES.observe(size, tool, stage)
+        OUTPUT_TOKENS.inc(tool, stage, amount=-(-size // BYTES_PER_TOKEN))
+    return text
@@ -0,0 +1,98 @@
+# services/gazetteer.py
+import difflib
+import json
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "gazetteer.json")
+
+# Minimum difflib ratio for a typo to resolve to a known place
+FUZZY_CUTOFF = float(os.environ.get("GAZETTEER_FUZZY_CUTOFF", "0.85"))
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def fold(name: str) -> str:
+    """Case- and accent-folded lookup key ("Lac Léman" -> "lac leman")."""
+    s = unicodedata.normalize("NFKD", (name or "").casefold())
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", s).strip()
+
+def _variants(name: str) -> set:
+    # German umlauts are often typed as ae/oe/ue ("Zuerichsee")
+    return {fold(name), fold(name.casefold().translate(_UMLAUTS))}
+
+class Gazetteer:
+    """
+    In-memory index over bundled Swiss places (towns, lakes, rivers).
+    Exact lookups are one dict access on the folded name or alias; prefix
+    search bisects the sorted key list; fuzzy matching is only tried on a
+    miss.
+    """
+
+    def __init__(self, places: list):
+        self.places = places
+        self._exact = {}
+        for idx, place in enumerate(places):
+            for name in [place["name"], *place.get("aliases", [])]:
+                for key in _variants(name):
+                    self._exact.setdefault(key, idx)  # first listed wins
+        self._keys = sorted(self._exact)
+
+    def __len__(self):
+        return len(self.places)
+
+    def exact(self, name: str) -> dict:
+        idx = self._exact.get(fold(name))
+        return None if idx is None else self.places[idx]
+
+    def prefix(self, prefix: str, limit: int = 10) -> list:
+        """Places whose folded name or alias starts with `prefix`."""
+        key = fold(prefix)
+        if not key:
+            return []
+        seen, out = set(), []
+        for i in range(bisect_left(self._keys, key), len(self._keys)):
+            k = self._keys[i]
+            if not k.startswith(key):
+                break
+            idx = self._exact[k]
+            if idx not in seen:
+                seen.add(idx)
+                out.append(self.places[idx])
+                if len(out) >= limit:
+                    break
+        return out
+
+    def fuzzy(self, name: str, cutoff: float = FUZZY_CUTOFF) -> dict:
+        key = fold(name)
+        if len(key) < 6:
+            return None
+        match = difflib.get_close_matches(key, self._keys, n=1, cutoff=cutoff)
+        return self.places[self._exact[match[0]]] if match else None
+
+    def resolve(self, name: str) -> dict:
+        """Exact, then unambiguous prefix (5+ chars), then fuzzy; None on a miss."""
+        place = self.exact(name)
+        if place is not None:
+            return place
+        if len(fold(name)) >= 5:
+            candidates = self.prefix(name, limit=2)
+            if len(candidates) == 1:
+                return candidates[0]
+        return self.fuzzy(name)
+
+_gazetteer = None
+
+def gazetteer() -> Gazetteer:
+    """Load the bundled gazetteer once per process."""
+    global _gazetteer
+    if _gazetteer is None:
+        places = []
+        if os.path.exists(DATA_PATH):
+            with open(DATA_PATH, "r", encoding="utf-8") as f:
+                places = json.load(f).get("places", [])
+        _gazetteer = Gazetteer(places)
+    return _gazetteer
@@ -1,14 +1,67 @@
 # services/geocode.py
 import requests
 import json
+import os
+
+from . import http_client
+from .cache import TTLCache
+from .cantons import canton_at
+from .gazetteer import gazetteer, fold
+from .metrics import register_cache
+from .singleflight import SingleFlight
+
+GEOCODE_URL = os.environ.get("OPEN_METEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+
+# Process-wide geocode cache shared by every service that resolves a place.
+# Successful lookups live for GEOCODE_CACHE_TTL seconds, errors only briefly
+# so a transient upstream failure does not pin a place as unknown.
+_geocode_cache = TTLCache(
+    maxsize=int(os.environ.get("GEOCODE_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("GEOCODE_CACHE_TTL", "86400")),
+)
+_GEOCODE_ERROR_TTL = float(os.environ.get("GEOCODE_ERROR_TTL", "30"))
+register_cache("geocode", _geocode_cache.stats)
+# Concurrent misses for the same place share one request
+_flight = SingleFlight("geocode")
+
+# Resolve known Swiss places from the bundled gazetteer before going remote
+GAZETTEER_ENABLED = os.environ.get("GAZETTEER_ENABLED", "1") == "1"
+
+def _cache_key(name: str, language: str) -> tuple:
+    return (" ".join((name or "").split()).casefold(), (language or "").lower())
+
+def geocode_cache_stats() -> dict:
+    """Return hit/miss counters and size of the shared geocode cache."""
+    return _geocode_cache.stats()
 
 def geocode_place(name: str, language: str = "de", timeout: float = 10.0) -> dict:
     """
-    Geocode a place name to lat/lon using Open-Meteo Geocoding API.
+    Geocode a place name to lat/lon. Known Swiss places resolve from the
+    offline gazetteer; anything else goes to the Open-Meteo Geocoding API
+    through the shared geocode cache.
     Returns {"name", "lat", "lon"} or {"error": "..."}
     """
+    if GAZETTEER_ENABLED:
+        place = gazetteer().resolve(name)
+        if place is not None:
+            return _from_gazetteer(place)
+
+    key = _cache_key(name, language)
+    cached = _geocode_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    return dict(_flight.do(key, _fetch_and_cache, key, name, language, timeout))
+
+def _fetch_and_cache(key: tuple, name: str, language: str, timeout: float) -> dict:
+    result = _fetch_geocode(name, language=language, timeout=timeout)
+    ttl = _GEOCODE_ERROR_TTL if "error" in result else None
+    _geocode_cache.set(key, result, ttl=ttl)
+    return result
+
+def _fetch_geocode(name: str, language: str = "de", timeout: float = 10.0) -> dict:
+    """Query the Open-Meteo Geocoding API without consulting the cache."""
     try:
-        url = "https://geocoding-api.open-meteo.com/v1/search"
         params = {
             "name": name,
             "language": language,
@@ -16,7 +69,7 @@ def geocode_place(name: str, language: str = "de", timeout: float = 10.0) -> dic
             "format": "json"
         }
         
-        r = requests.get(url, params=params, timeout=timeout)
+        r = http_client.get(GEOCODE_URL, params=params, timeout=timeout, stale_ok=True)
         r.raise_for_status()
         data = r.json() or {}
         
@@ -30,6 +83,7 @@ def geocode_place(name: str, language: str = "de", timeout: float = 10.0) -> dic
             "lat": result.get("latitude"),
             "lon": result.get("longitude"),
             "country": result.get("country"),
+            "country_code": result.get("country_code"),
             "admin1": result.get("admin1"),  # Canton/State
         }
     except requests.exceptions.Timeout:
@@ -39,10 +93,103 @@ def geocode_place(name: str, language: str = "de", timeout: float = 10.0) -> dic
     except Exception as e:
         return {"error": f"geocode_failed: {str(e)}"}
 
+# Map Swiss cantons
+CANTON_MAP = {
+    "ZURICH": "ZH",
+    "BERN": "BE",
+    "LUCERNE": "LU",
+    "URI": "UR",
+    "SCHWYZ": "SZ",
+    "OBWALDEN": "OW",
+    "NIDWALDEN": "NW",
+    "GLARUS": "GL",
+    "ZUG": "ZG",
+    "FRIBOURG": "FR",
+    "SOLOTHURN": "SO",
+    "BASEL-STADT": "BS",
+    "BASEL-LANDSCHAFT": "BL",
+    "SCHAFFHAUSEN": "SH",
+    "APPENZELL AUSSERRHODEN": "AR",
+    "APPENZELL INNERRHODEN": "AI",
+    "ST. GALLEN": "SG",
+    "GRAUBUNDEN": "GR",
+    "AARGAU": "AG",
+    "THURGAU": "TG",
+    "TICINO": "TI",
+    "VAUD": "VD",
+    "VALAIS": "VS",
+    "NEUCHATEL": "NE",
+    "JURA": "JU",
+    "GENEVA": "GE",
+}
+
+CANTON_NAMES = {code: name.title() for name, code in CANTON_MAP.items()}
+
+# Localized admin1 spellings returned by the geocoder, keyed by fold()
+_CANTON_ALIASES = {
+    **{fold(name): code for name, code in CANTON_MAP.items()},
+    "luzern": "LU", "lucerna": "LU", "freiburg": "FR", "sankt gallen": "SG",
+    "st gallen": "SG", "saint gall": "SG", "graubunden": "GR", "grisons": "GR",
+    "grigioni": "GR", "tessin": "TI", "waadt": "VD", "wallis": "VS",
+    "neuenburg": "NE", "genf": "GE", "geneve": "GE", "ginevra": "GE",
+    "berne": "BE", "basel stadt": "BS", "bale ville": "BS", "basel city": "BS",
+    "basel land": "BL", "bale campagne": "BL", "soleure": "SO", "argovie": "AG",
+    "thurgovie": "TG", "zurigo": "ZH", "zoug": "ZG", "schwytz": "SZ",
+    "glaris": "GL", "schaffhouse": "SH",
+}
+
+def _from_gazetteer(place: dict) -> dict:
+    # Waters shared by several cantons carry "cantons" and no single canton
+    canton = place.get("canton")
+    return {
+        "name": place["name"],
+        "lat": place["lat"],
+        "lon": place["lon"],
+        "country": "Switzerland",
+        "country_code": "CH",
+        "admin1": CANTON_NAMES.get(canton),
+        "canton": canton,
+        "cantons": place.get("cantons") or [canton],
+        "source": "gazetteer",
+    }
+
+# Country names the geocoder may return for Switzerland, keyed by fold()
+_SWISS_COUNTRY_NAMES = {"switzerland", "schweiz", "suisse", "svizzera", "svizra"}
+
+def _in_switzerland(g: dict):
+    """True/False from the geocoder's country fields; None if it gave neither."""
+    if g.get("country_code"):
+        return g["country_code"].upper() == "CH"
+    if g.get("country"):
+        return fold(g["country"]) in _SWISS_COUNTRY_NAMES
+    return None
+
+def canton_code(g: dict) -> str:
+    """
+    Two-letter canton code for a geocode result, or "UNKNOWN".
+    Places outside Switzerland are "UNKNOWN". A gazetteer place within
+    one canton has it; otherwise the geocoder's admin1 is authoritative
+    and the bundled (approximate) canton outlines are only used when
+    admin1 is missing or not a canton name, as for waters shared by
+    several cantons.
+    """
+    if g.get("canton"):
+        return g["canton"]
+    if _in_switzerland(g) is False:
+        return "UNKNOWN"
+    code = _CANTON_ALIASES.get(fold(g.get("admin1")))
+    if code:
+        return code
+    if g.get("lat") is not None and g.get("lon") is not None:
+        return canton_at(g["lat"], g["lon"]) or "UNKNOWN"
+    return "UNKNOWN"
+
 def canton_from_place(name: str, language: str = "de", timeout: float = 10.0) -> dict:
     """
     Extract canton/state from a place name using geocoding.
-    Returns {"place", "canton"} or {"error": "..."}
+    Returns {"place", "canton", "admin1"}, plus "cantons" for a water
+    shared by several cantons (whose "canton" is then only the one at
+    its bundled center), or {"error": "..."}
     """
     try:
         g = geocode_place(name, language=language, timeout=timeout)
@@ -50,44 +197,14 @@ def canton_from_place(name: str, language: str = "de", timeout: float = 10.0) ->
         if "error" in g:
             return {"error": g["error"], "place": name}
         
-        # Map Swiss cantons
-        admin1 = g.get("admin1", "").upper()
-        canton_map = {
-            "ZURICH": "ZH",
-            "BERN": "BE",
-            "LUCERNE": "LU",
-            "URI": "UR",
-            "SCHWYZ": "SZ",
-            "OBWALDEN": "OW",
-            "NIDWALDEN": "NW",
-            "GLARUS": "GL",
-            "ZUG": "ZG",
-            "FRIBOURG": "FR",
-            "SOLOTHURN": "SO",
-            "BASEL-STADT": "BS",
-            "BASEL-LANDSCHAFT": "BL",
-            "SCHAFFHAUSEN": "SH",
-            "APPENZELL AUSSERRHODEN": "AR",
-            "APPENZELL INNERRHODEN": "AI",
-            "ST. GALLEN": "SG",
-            "GRAUBUNDEN": "GR",
-            "AARGAU": "AG",
-            "THURGAU": "TG",
-            "TICINO": "TI",
-            "VAUD": "VD",
-            "VALAIS": "VS",
-            "NEUCHATEL": "NE",
-            "JURA": "JU",
-            "GENEVA": "GE",
-        }
-        
-        canton = canton_map.get(admin1, "UNKNOWN")
-        
-        return {
+        result = {
             "place": g.get("name"),
-            "canton": canton,
-            "admin1": admin1
+            "canton": canton_code(g),
+            "admin1": (g.get("admin1") or "").upper()
         }
+        if len(g.get("cantons") or []) > 1:
+            result["cantons"] = g["cantons"]
+        return result
     
     except Exception as e:
         return {"error": f"canton_extraction_failed: {str(e)}", "place": name}
@@ -0,0 +1,165 @@
+# services/http_client.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeout, wait
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import resilience
+from .metrics import UPSTREAM_SECONDS, UPSTREAM_ERRORS
+from .resilience import CircuitOpen, LastGood
+
+# Distinct upstream hosts kept in the pool (open-meteo x2, gbif, hydro, ...)
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "8"))
+# Keep-alive connections per host; should cover TOOL_WORKERS in app.py
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "16"))
+RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.3"))
+
+# Statuses that count against a host's circuit breaker
+_FAILURE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+USER_AGENT = "FischBuddy/1.0 (+https://github.com/yourname/fishbuddy)"
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["User-Agent"] = USER_AGENT
+    return s
+
+# One pooled, keep-alive session shared by every module in `services`
+session = _build_session()
+
+# First and second attempts of hedged GETs run on separate pools, both
+# sized like the connection pool, so slow first attempts can never keep
+# the hedges meant to overtake them queued
+_first_pool = ThreadPoolExecutor(max_workers=POOL_MAXSIZE, thread_name_prefix="http-first")
+_hedge_pool = ThreadPoolExecutor(max_workers=POOL_MAXSIZE, thread_name_prefix="http-hedge")
+_last_good = LastGood()
+
+def _attempt(host: str, url: str, params: dict, timeout: float, kwargs: dict) -> requests.Response:
+    """One GET with metrics, feeding the host's breaker and latency window."""
+    breaker = resilience.breaker(host)
+    started = time.perf_counter()
+    try:
+        r = session.get(url, params=params, timeout=timeout, **kwargs)
+    except requests.exceptions.Timeout:
+        UPSTREAM_ERRORS.inc(host, "timeout")
+        breaker.failure()
+        raise
+    except requests.exceptions.RequestException:
+        UPSTREAM_ERRORS.inc(host, "connection")
+        breaker.failure()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_SECONDS.observe(elapsed, host)
+    if r.status_code >= 400:
+        UPSTREAM_ERRORS.inc(host, str(r.status_code))
+    if r.status_code in _FAILURE_STATUSES:
+        breaker.failure()
+    else:
+        breaker.success()
+        resilience.latency(host).add(elapsed)
+    return r
+
+def _hedged(host: str, url: str, params: dict, timeout: float, kwargs: dict) -> requests.Response:
+    """
+    Send a second attempt if the first is still running after the host's
+    p95 latency and return whichever succeeds first. The slower attempt is
+    left to finish in the background.
+    """
+    delay = resilience.latency(host).p95()
+    if delay is None:
+        return _attempt(host, url, params, timeout, kwargs)
+
+    first = _first_pool.submit(_attempt, host, url, params, timeout, kwargs)
+    try:
+        return first.result(timeout=max(delay, resilience.HEDGE_MIN_DELAY))
+    except FutureTimeout:
+        pass
+    resilience.HEDGES.inc(host)
+    pending = {first, _hedge_pool.submit(_attempt, host, url, params, timeout, kwargs)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+    raise error
+
+def get(url: str, params: dict = None, timeout: float = 10.0, stale_ok: bool = False, **kwargs) -> requests.Response:
+    """
+    GET through the shared session. Connections are reused per host and
+    idempotent requests are retried with exponential backoff on connection
+    errors and 429/5xx responses; `timeout` applies to each attempt.
+    Latency and failures are recorded per upstream host.
+
+    A host that keeps failing trips its circuit breaker, and calls raise
+    CircuitOpen without waiting on it. With HTTP_HEDGE=1, a request slower
+    than the host's p95 is hedged with a second attempt. With `stale_ok`,
+    the last good response to the same request is kept and served in
+    place of an error; `resilience.stale_age(r)` then gives its age.
+    """
+    host = _host(url)
+    key = LastGood.key(url, params) if stale_ok else None
+    breaker = resilience.breaker(host)
+
+    if not breaker.allow():
+        UPSTREAM_ERRORS.inc(host, "circuit_open")
+        stale = _stale(key, url, host)
+        if stale is not None:
+            return stale
+        raise CircuitOpen(f"circuit open for {host}")
+
+    try:
+        if resilience.HEDGE and breaker.state == breaker.CLOSED:
+            r = _hedged(host, url, params, timeout, kwargs)
+        else:
+            r = _attempt(host, url, params, timeout, kwargs)
+    except requests.exceptions.RequestException:
+        stale = _stale(key, url, host)
+        if stale is not None:
+            return stale
+        raise
+
+    if key is not None:
+        if r.status_code in _FAILURE_STATUSES:
+            stale = _stale(key, url, host)
+            if stale is not None:
+                return stale
+        elif r.ok:
+            _last_good.put(key, r)
+    return r
+
+def _stale(key: tuple, url: str, host: str) -> requests.Response:
+    if key is None:
+        return None
+    r = _last_good.response(key, url)
+    if r is not None:
+        resilience.STALE_SERVED.inc(host)
+    return r
+
+@lru_cache(maxsize=256)
+def _host(url: str) -> str:
+    return urlsplit(url).netloc
@@ -1,57 +1,276 @@
 # services/hydro.py
-import requests
-import json
-import math
+import logging
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def _haversine_km(lat1, lon1, lat2, lon2) -> float:
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
-    return 2*R*math.asin(math.sqrt(a))
+from . import http_client
+from .metrics import gauge, register_cache
+from .resilience import stale_age
+from .singleflight import SingleFlight
+from .spatial import GridIndex
 
-def get_water_data(name: str, language: str = "de", timeout: float = 10.0) -> dict:
+log = logging.getLogger("fishbuddy.hydro")
+
+STATIONS_TTL = float(os.environ.get("HYDRO_STATIONS_TTL", "21600"))
+# After a failed refresh, keep serving the previous list and retry this soon
+_STATIONS_RETRY = 60.0
+
+# Opt-in background refresh of every station's latest reading. Readings
+# change on a ~10 min cadence, so request-time fetches are mostly wasted.
+PREFETCH = os.environ.get("HYDRO_PREFETCH", "0") == "1"
+PREFETCH_INTERVAL = float(os.environ.get("HYDRO_PREFETCH_INTERVAL", "600"))
+# Each wait is scaled by a random factor in [1 - jitter, 1 + jitter] so
+# several workers don't hit the proxy in lockstep
+PREFETCH_JITTER = float(os.environ.get("HYDRO_PREFETCH_JITTER", "0.2"))
+PREFETCH_WORKERS = int(os.environ.get("HYDRO_PREFETCH_WORKERS", "8"))
+# Snapshot readings older than this are fetched live at request time
+READING_MAX_AGE = float(os.environ.get("HYDRO_READING_MAX_AGE", "1200"))
+
+class StationRegistry:
+    """
+    In-memory copy of the hydro proxy's `{base}/locations` list with a
+    spatial index on top. Refreshed at most every `ttl` seconds; a failed
+    refresh keeps the previous index.
+    """
+
+    def __init__(self, base: str, ttl: float = STATIONS_TTL):
+        self.base = base
+        self.ttl = ttl
+        self._index = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def index(self, timeout: float = 10.0) -> GridIndex:
+        if self._index is not None and time.monotonic() < self._expires_at:
+            return self._index
+        with self._lock:
+            if self._index is None or time.monotonic() >= self._expires_at:
+                self._refresh(timeout)
+        return self._index
+
+    def _refresh(self, timeout: float):
+        try:
+            stations = http_client.get(f"{self.base}/locations", timeout=timeout, stale_ok=True).json() or []
+        except Exception:
+            if self._index is None:
+                raise
+            self._expires_at = time.monotonic() + _STATIONS_RETRY
+            return
+
+        points = [
+            (s["lat"], s["lon"], s)
+            for s in stations
+            if s.get("lat") is not None and s.get("lon") is not None
+        ]
+        self._index = GridIndex(points)
+        self._expires_at = time.monotonic() + self.ttl
+
+    def nearest(self, lat: float, lon: float, k: int = 1, radius_km: float = None, timeout: float = 10.0) -> list:
+        """Return up to `k` (distance_km, station) pairs, nearest first."""
+        return self.index(timeout).nearest(lat, lon, k=k, radius_km=radius_km)
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def _hydro_base() -> str:
+    return os.environ.get("FOEN_PROXY_BASE", "https://api.existenz.ch/hydro")
+
+def station_registry(base: str = None) -> StationRegistry:
+    """Return the process-wide station registry for a hydro proxy base URL."""
+    base = base or _hydro_base()
+    with _registries_lock:
+        if base not in _registries:
+            _registries[base] = StationRegistry(base)
+        return _registries[base]
+
+# Request-time and prefetch reads of the same station share one request
+_flight = SingleFlight("hydro")
+
+def _fetch_reading(base: str, station_id: str, timeout: float = 10.0) -> tuple:
+    """(reading, age in seconds); the age is non-zero when the proxy is down and the last good reading is served."""
+    return _flight.do((base, station_id), _get_reading, base, station_id, timeout)
+
+def _get_reading(base: str, station_id: str, timeout: float) -> tuple:
+    r = http_client.get(f"{base}/{station_id}", timeout=timeout, stale_ok=True)
+    latest = r.json() or {}
+    reading = {"water_temp_c": latest.get("water_temp_c"), "discharge_m3s": latest.get("discharge_m3s")}
+    return reading, stale_age(r) or 0.0
+
+class ReadingSnapshot:
+    """Latest reading per station id with the wall-clock time it was fetched."""
+
+    def __init__(self):
+        self._readings = {}  # station id -> (reading, fetched_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, station_id: str, max_age: float = READING_MAX_AGE) -> tuple:
+        """(reading, age in seconds), or None if missing or older than max_age."""
+        entry = self._readings.get(station_id)
+        age = time.time() - entry[1] if entry is not None else None
+        with self._lock:
+            if age is None or age > max_age:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[0], age
+
+    def put(self, station_id: str, reading: dict, fetched_at: float = None):
+        with self._lock:
+            self._readings[station_id] = (reading, fetched_at or time.time())
+
+    def oldest_age(self) -> float:
+        with self._lock:
+            oldest = min((t for _, t in self._readings.values()), default=None)
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._readings), "hits": self.hits, "misses": self.misses}
+
+class HydroPrefetcher:
+    """
+    Daemon thread that fetches the latest reading of every registered
+    station into a ReadingSnapshot, once at start and then every
+    `interval` seconds (jittered). A failed station keeps its previous
+    reading until that ages out of the snapshot.
+    """
+
+    def __init__(self, base: str, snapshot: ReadingSnapshot, interval: float = PREFETCH_INTERVAL,
+                 jitter: float = PREFETCH_JITTER, workers: int = PREFETCH_WORKERS):
+        self.base = base
+        self.snapshot = snapshot
+        self.interval = interval
+        self.jitter = jitter
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hydro-prefetch")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="hydro-prefetcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning("Hydro prefetch failed: %s", e)
+            self._stop.wait(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def refresh(self, timeout: float = 10.0):
+        """Fetch every station once; returns (fetched, failed)."""
+        started = time.monotonic()
+        stations = station_registry(self.base).index(timeout).items()
+
+        def fetch(station_id):
+            reading, age = _fetch_reading(self.base, station_id, timeout)
+            self.snapshot.put(station_id, reading, time.time() - age)
+
+        futures = [self._pool.submit(fetch, s["id"]) for s in stations if s.get("id") is not None]
+        failed = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                failed += 1
+        log.info("Hydro prefetch: %d stations in %.1fs, %d failed",
+                 len(futures), time.monotonic() - started, failed)
+        return len(futures) - failed, failed
+
+_snapshot = ReadingSnapshot()
+_prefetcher = None
+
+register_cache("hydro_readings", _snapshot.stats)
+gauge("fishbuddy_hydro_snapshot_oldest_seconds", "Age of the oldest prefetched hydro reading.",
+      (), lambda: {(): _snapshot.oldest_age()} if _prefetcher is not None else {})
+
+def start_prefetcher(base: str = None) -> HydroPrefetcher:
+    """Start the process-wide hydro prefetcher (idempotent)."""
+    global _prefetcher
+    with _registries_lock:
+        if _prefetcher is None:
+            _prefetcher = HydroPrefetcher(base or _hydro_base(), _snapshot)
+            _prefetcher.start()
+        return _prefetcher
+
+def _reading(base: str, station_id: str, timeout: float) -> tuple:
+    """(reading, age in seconds): from the prefetched snapshot when fresh, else live."""
+    if _prefetcher is None or _prefetcher.base != base:
+        return _fetch_reading(base, station_id, timeout)
+    hit = _snapshot.get(station_id)
+    if hit is not None:
+        return hit
+    reading, age = _fetch_reading(base, station_id, timeout)
+    _snapshot.put(station_id, reading, time.time() - age)
+    return reading, age
+
+def station_reading(station_id: str, timeout: float = 10.0) -> tuple:
+    """(latest reading, age in seconds) of one station."""
+    return _reading(_hydro_base(), station_id, timeout)
+
+def water_data_at(lat: float, lon: float, k: int = 1, radius_km: float = None, timeout: float = 10.0) -> list:
+    """
+    Latest readings of the k stations closest to (lat, lon), nearest first.
+    Returns [{"station_id", "station_name", "distance_km", "water_temp_c",
+    "discharge_m3s", "data_age_s"}].
+    """
+    base = _hydro_base()
+    readings = []
+    for dist, station in station_registry(base).nearest(lat, lon, k=k, radius_km=radius_km, timeout=timeout):
+        latest, age = _reading(base, station["id"], timeout)
+        readings.append({
+            "station_id": station.get("id"),
+            "station_name": station.get("name"),
+            "distance_km": round(dist, 1),
+            "water_temp_c": latest.get("water_temp_c"),
+            "discharge_m3s": latest.get("discharge_m3s"),
+            "data_age_s": round(age)
+        })
+    return readings
+
+def get_water_data(name: str, language: str = "de", timeout: float = 10.0, k: int = 1, radius_km: float = None) -> dict:
     """
     Resolve place then return nearby hydrology (water temp/flow).
+    With k > 1, readings of the k closest stations (optionally within
+    radius_km) are listed under "nearby" instead.
     Falls back gracefully if hydro proxy is unavailable.
     """
     from .geocode import geocode_place
-    
+
+    k = max(1, int(k))
     try:
         g = geocode_place(name, language=language, timeout=timeout)
         if "error" in g:
-            return json.dumps({"error": "geocode_failed", "place": name})
-        
+            return {"error": "geocode_failed", "place": name}
+
         # Try to fetch hydro data from a proxy or fallback gracefully
-        base = os.environ.get("FOEN_PROXY_BASE", "https://api.existenz.ch/hydro")
-        
         try:
-            stations = requests.get(f"{base}/locations", timeout=timeout).json()
-            if not stations:
-                return json.dumps({
+            readings = water_data_at(g["lat"], g["lon"], k=k, radius_km=radius_km, timeout=timeout)
+            if not readings:
+                return {
                     "place": g.get("name"),
                     "note": "No hydrology data available; try again later."
-                })
-            
-            tgt = min(stations, key=lambda s: _haversine_km(g["lat"], g["lon"], s.get("lat", 0), s.get("lon", 0)))
-            latest = requests.get(f'{base}/{tgt["id"]}', timeout=timeout).json()
-            
-            result = {
-                "place": g.get("name"),
-                "station_id": tgt.get("id"),
-                "station_name": tgt.get("name"),
-                "water_temp_c": latest.get("water_temp_c"),
-                "discharge_m3s": latest.get("discharge_m3s")
-            }
-            return json.dumps(result)
-        
+                }
+
+            if k > 1:
+                return {"place": g.get("name"), "nearby": readings}
+            return {"place": g.get("name"), **readings[0]}
+
         except Exception as e:
             # Graceful fallback
-            return json.dumps({
+            return {
                 "place": g.get("name"),
                 "note": f"Water data unavailable ({e.__class__.__name__}); check FOEN station data manually."
-            })
-    
+            }
+
     except Exception as e:
-        return json.dumps({"error": f"hydro_failed: {str(e)}", "place": name})
+        return {"error": f"hydro_failed: {str(e)}", "place": name}
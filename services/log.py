@@ -0,0 +1,57 @@
+# services/log.py
+"""
+Leveled logging for the backend.
+
+Modules log through `logging.getLogger("fishbuddy...")` with %-style
+arguments, so a disabled level costs one `isEnabledFor` check and no
+string formatting. `configure()` installs a single stderr handler whose
+format is chosen by LOG_FORMAT: "text" (default) or "json" (one object
+per line, including any `extra={...}` fields).
+"""
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord carries; anything else came from `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                doc[key] = value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = [f"{k}={v}" for k, v in vars(record).items() if k not in _RESERVED]
+        return f"{line} {' '.join(extra)}" if extra else line
+
+def configure(level: str = None, fmt: str = None):
+    """Attach the handler to the "fishbuddy" logger; safe to call more than once."""
+    logger = logging.getLogger("fishbuddy")
+    logger.setLevel(level or LOG_LEVEL)
+    logger.propagate = False
+    handler = next((h for h in logger.handlers if getattr(h, "_fishbuddy", False)), None)
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler._fishbuddy = True
+        logger.addHandler(handler)
+    handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+    return logger
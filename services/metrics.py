@@ -0,0 +1,221 @@
+# services/metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+Histograms use fixed buckets and one lock per labelled series, so an
+observation is a bisect and a few integer increments. Gauges are read
+from callbacks at scrape time, which keeps cache statistics out of the
+hot path entirely.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; spans cached lookups (ms) up to slow upstreams and long runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count", "lock")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label tuple."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, values: tuple) -> _HistogramSeries:
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _HistogramSeries(len(self.buckets) + 1))
+        return series
+
+    def observe(self, value: float, *labels):
+        series = self._get(labels)
+        idx = bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[idx] += 1
+            series.sum += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall time of the `with` block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self) -> list:
+        lines = []
+        for values, series in sorted(self._series.items()):
+            with series.lock:
+                counts, total, n = list(series.counts), series.sum, series.count
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = _labels(self.labelnames, values, f'le="{_num(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {running}")
+            label = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{label} {_num(total)}")
+            lines.append(f"{self.name}_count{label} {n}")
+        return lines
+
+class Counter:
+    """Monotonic counter, one value per label tuple."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(v)}" for values, v in items]
+
+class Gauge:
+    """Values computed at scrape time by `fn() -> {label_tuple: value}`."""
+
+    def __init__(self, name: str, doc: str, labels: tuple, fn, kind: str = "gauge"):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def collect(self) -> list:
+        try:
+            items = sorted(self.fn().items())
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(v)}" for values, v in items]
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+def histogram(name: str, doc: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a process-wide histogram."""
+    return _register(Histogram(name, doc, labels, buckets))
+
+def counter(name: str, doc: str, labels: tuple = ()) -> Counter:
+    """Get or create a process-wide counter."""
+    return _register(Counter(name, doc, labels))
+
+def gauge(name: str, doc: str, labels: tuple, fn, kind: str = "gauge") -> Gauge:
+    """Register a scrape-time metric; re-registering a name replaces its callback."""
+    metric = Gauge(name, doc, labels, fn, kind)
+    with _registry_lock:
+        _registry[name] = metric
+    return metric
+
+_caches = {}
+
+def register_cache(name: str, stats_fn):
+    """
+    Export a cache's counters. `stats_fn()` returns a dict with at least
+    "hits", "misses" and "size"; it is only called on scrape.
+    """
+    _caches[name] = stats_fn
+
+def _cache_stats() -> dict:
+    out = {}
+    for name, fn in list(_caches.items()):
+        try:
+            out[name] = fn()
+        except Exception:
+            continue
+    return out
+
+def _cache_field(field: str):
+    return lambda: {(name,): s[field] for name, s in _cache_stats().items()}
+
+def _cache_ratio() -> dict:
+    out = {}
+    for name, s in _cache_stats().items():
+        lookups = s["hits"] + s["misses"]
+        out[(name,)] = round(s["hits"] / lookups, 4) if lookups else 0.0
+    return out
+
+def render() -> str:
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.doc}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.collect())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Shared series used across app.py, asgi.py and the services layer
+TOOL_SECONDS = histogram("fishbuddy_tool_duration_seconds", "Tool call latency.", ("tool",))
+TOOL_ERRORS = counter("fishbuddy_tool_errors_total", "Failed tool calls by reason.", ("tool", "reason"))
+UPSTREAM_SECONDS = histogram("fishbuddy_upstream_duration_seconds", "Upstream HTTP latency per host.", ("host",))
+UPSTREAM_ERRORS = counter("fishbuddy_upstream_errors_total", "Upstream HTTP failures per host.", ("host", "reason"))
+OPENAI_SECONDS = histogram("fishbuddy_openai_duration_seconds", "OpenAI API call latency.", ("op",))
+OPENAI_ERRORS = counter("fishbuddy_openai_errors_total", "Failed OpenAI API calls.", ("op",))
+CHAT_TTFB = histogram("fishbuddy_chat_ttfb_seconds", "Time from /api/chat request to first SSE frame.")
+CHAT_SECONDS = histogram("fishbuddy_chat_duration_seconds", "Duration of /api/chat streams.", ("outcome",))
+RUN_PROMPT_TOKENS = histogram("fishbuddy_run_prompt_tokens", "Prompt tokens billed per completed Assistants run.",
+                              buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+
+gauge("fishbuddy_cache_hits_total", "Cache hits.", ("cache",), _cache_field("hits"), kind="counter")
+gauge("fishbuddy_cache_misses_total", "Cache misses.", ("cache",), _cache_field("misses"), kind="counter")
+gauge("fishbuddy_cache_entries", "Live cache entries.", ("cache",), _cache_field("size"))
+gauge("fishbuddy_cache_hit_ratio", "Cache hits / lookups since start.", ("cache",), _cache_ratio)
+
+@contextmanager
+def openai_call(op: str):
+    """Time one OpenAI API call and count it as failed if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OPENAI_ERRORS.inc(op)
+        raise
+    finally:
+        OPENAI_SECONDS.observe(time.perf_counter() - started, op)
@@ -0,0 +1,233 @@
+# services/registry.py
+"""
+Registry of uploaded files, scoped per chat thread.
+
+Two backends share one interface: `MemoryRegistry` (single process, the
+old behaviour) and `SQLiteRegistry`, an embedded WAL-mode database that
+several worker processes on one host can open at once. Select with
+FILE_REGISTRY=memory|sqlite.
+
+Each (session, file) entry expires FILE_REGISTRY_TTL seconds after its
+last upload. Content hashes map to the OpenAI file holding that content,
+so a document shared by several sessions is uploaded once and only
+deleted remotely when the last session lets go of it.
+"""
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+
+BACKEND = os.environ.get("FILE_REGISTRY", "sqlite").lower()
+DB_PATH = os.environ.get(
+    "FILE_REGISTRY_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "fishbuddy.db"),
+)
+TTL = float(os.environ.get("FILE_REGISTRY_TTL", str(7 * 86400)))
+
+# Session used when a client does not send its thread id
+DEFAULT_SESSION = "default"
+
+class FileRegistry(ABC):
+    """Interface implemented by the registry backends."""
+
+    @abstractmethod
+    def add(self, session_id: str, file_id: str, filename: str,
+            sha256: str = None, size: int = None, ttl: float = None):
+        """Record (or refresh) `file_id` for a session."""
+
+    @abstractmethod
+    def list(self, session_id: str) -> list:
+        """Live files of a session as [{"id", "filename", "uploaded_at"}], oldest first."""
+
+    @abstractmethod
+    def remove(self, session_id: str, file_id: str) -> bool:
+        """Drop a session's reference; True if no session references `file_id` any more."""
+
+    @abstractmethod
+    def purge_expired(self, now: float = None) -> list:
+        """Delete expired entries in bulk; returns file ids left without any reference."""
+
+    @abstractmethod
+    def find_content(self, sha256: str) -> dict:
+        """{"file_id", "size"} of an earlier upload with this digest, or None."""
+
+    @abstractmethod
+    def add_content(self, sha256: str, file_id: str, size: int):
+        """Remember `file_id` as the upload holding content with this digest."""
+
+class MemoryRegistry(FileRegistry):
+    """Process-local registry; entries vanish on restart and are not shared between workers."""
+
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self._files = {}     # (session_id, file_id) -> entry
+        self._contents = {}  # sha256 -> {"file_id", "size"}
+        self._lock = threading.Lock()
+
+    def add(self, session_id, file_id, filename, sha256=None, size=None, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._files[(session_id, file_id)] = {
+                "id": file_id, "filename": filename, "sha256": sha256, "size": size,
+                "uploaded_at": now, "expires_at": now + (self.ttl if ttl is None else ttl),
+            }
+
+    def list(self, session_id):
+        now = time.time()
+        with self._lock:
+            entries = [e for (s, _), e in self._files.items() if s == session_id and e["expires_at"] > now]
+        entries.sort(key=lambda e: e["uploaded_at"])
+        return [{"id": e["id"], "filename": e["filename"], "uploaded_at": e["uploaded_at"]} for e in entries]
+
+    def _orphans(self, file_ids) -> list:
+        live = {f for _, f in self._files}
+        orphans = [f for f in dict.fromkeys(file_ids) if f not in live]
+        if orphans:
+            gone = set(orphans)
+            self._contents = {k: v for k, v in self._contents.items() if v["file_id"] not in gone}
+        return orphans
+
+    def remove(self, session_id, file_id):
+        with self._lock:
+            self._files.pop((session_id, file_id), None)
+            return bool(self._orphans([file_id]))
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            keys = [k for k, e in self._files.items() if e["expires_at"] <= now]
+            for k in keys:
+                del self._files[k]
+            return self._orphans(f for _, f in keys)
+
+    def find_content(self, sha256):
+        with self._lock:
+            entry = self._contents.get(sha256)
+        return dict(entry) if entry else None
+
+    def add_content(self, sha256, file_id, size):
+        with self._lock:
+            self._contents[sha256] = {"file_id": file_id, "size": size}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_files (
+    session_id  TEXT NOT NULL,
+    file_id     TEXT NOT NULL,
+    filename    TEXT,
+    sha256      TEXT,
+    size        INTEGER,
+    uploaded_at REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    PRIMARY KEY (session_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS session_files_file_id ON session_files (file_id);
+CREATE INDEX IF NOT EXISTS session_files_expires ON session_files (expires_at);
+CREATE TABLE IF NOT EXISTS contents (
+    sha256     TEXT PRIMARY KEY,
+    file_id    TEXT NOT NULL,
+    size       INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contents_file_id ON contents (file_id);
+"""
+
+# SQLite's default bound-parameter limit is 999
+_BATCH = 500
+
+class SQLiteRegistry(FileRegistry):
+    """
+    Registry in an SQLite database in WAL mode: readers never block the
+    writer, so every worker process can open the same file. Connections
+    are per thread; writes that must be atomic across statements run in
+    BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(self, path: str = DB_PATH, ttl: float = TTL):
+        self.path = os.path.abspath(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def add(self, session_id, file_id, filename, sha256=None, size=None, ttl=None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO session_files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, file_id, filename, sha256, size, now, now + (self.ttl if ttl is None else ttl)),
+        )
+
+    def list(self, session_id):
+        rows = self._conn().execute(
+            "SELECT file_id, filename, uploaded_at FROM session_files "
+            "WHERE session_id = ? AND expires_at > ? ORDER BY uploaded_at",
+            (session_id, time.time()),
+        ).fetchall()
+        return [{"id": r["file_id"], "filename": r["filename"], "uploaded_at": r["uploaded_at"]} for r in rows]
+
+    def _drop_orphans(self, conn, file_ids) -> list:
+        """Within a transaction: file ids no longer referenced, with their content rows removed."""
+        candidates = list(dict.fromkeys(file_ids))
+        orphans = []
+        for i in range(0, len(candidates), _BATCH):
+            batch = candidates[i:i + _BATCH]
+            marks = ",".join("?" * len(batch))
+            live = {r[0] for r in conn.execute(
+                f"SELECT DISTINCT file_id FROM session_files WHERE file_id IN ({marks})", batch)}
+            gone = [f for f in batch if f not in live]
+            if gone:
+                conn.execute(f"DELETE FROM contents WHERE file_id IN ({','.join('?' * len(gone))})", gone)
+                orphans.extend(gone)
+        return orphans
+
+    def _delete_where(self, where: str, params: tuple) -> list:
+        conn = self._transaction()
+        try:
+            ids = [r[0] for r in conn.execute(f"SELECT file_id FROM session_files WHERE {where}", params)]
+            conn.execute(f"DELETE FROM session_files WHERE {where}", params)
+            orphans = self._drop_orphans(conn, ids)
+            conn.execute("COMMIT")
+            return orphans
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, session_id, file_id):
+        return bool(self._delete_where("session_id = ? AND file_id = ?", (session_id, file_id)))
+
+    def purge_expired(self, now=None):
+        return self._delete_where("expires_at <= ?", (time.time() if now is None else now,))
+
+    def find_content(self, sha256):
+        row = self._conn().execute("SELECT file_id, size FROM contents WHERE sha256 = ?", (sha256,)).fetchone()
+        return {"file_id": row["file_id"], "size": row["size"]} if row else None
+
+    def add_content(self, sha256, file_id, size):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO contents VALUES (?, ?, ?, ?)",
+            (sha256, file_id, size, time.time()),
+        )
+
+def open_registry(backend: str = None) -> FileRegistry:
+    """Registry selected by FILE_REGISTRY (default "sqlite")."""
+    backend = (backend or BACKEND).lower()
+    if backend == "memory":
+        return MemoryRegistry()
+    if backend == "sqlite":
+        return SQLiteRegistry()
+    raise ValueError(f"unknown FILE_REGISTRY backend: {backend}")
@@ -0,0 +1,159 @@
+# services/resilience.py
+"""
+Per-host protection against slow or failing upstreams, applied by
+`http_client.get`:
+
+- CircuitBreaker: after BREAKER_FAILURES consecutive failures (timeouts,
+  connection errors, 429/5xx) a host is open and calls fail immediately
+  for BREAKER_COOLDOWN seconds. Then a single probe is let through
+  (half-open) and its outcome closes or re-opens the breaker.
+- LatencyWindow: recent successful latencies per host; their p95 is the
+  delay after which an idempotent GET is hedged with a second attempt.
+- LastGood: the last successful body per request, served with its age
+  while the upstream is unavailable.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+from .cache import TTLCache
+from .metrics import counter, gauge
+
+BREAKER_FAILURES = int(os.environ.get("HTTP_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("HTTP_BREAKER_COOLDOWN", "30"))
+
+# Hedging is opt-in: it trades extra upstream load for tail latency
+HEDGE = os.environ.get("HTTP_HEDGE", "0") == "1"
+HEDGE_MIN_DELAY = float(os.environ.get("HTTP_HEDGE_MIN_DELAY", "0.05"))
+# No hedging until a host has this many samples
+HEDGE_MIN_SAMPLES = int(os.environ.get("HTTP_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+LAST_GOOD_SIZE = int(os.environ.get("HTTP_LAST_GOOD_SIZE", "2048"))
+LAST_GOOD_TTL = float(os.environ.get("HTTP_LAST_GOOD_TTL", "86400"))
+
+HEDGES = counter("fishbuddy_upstream_hedges_total", "Second attempts sent for slow upstream GETs.", ("host",))
+STALE_SERVED = counter("fishbuddy_upstream_stale_total", "Last good responses served instead of upstream.", ("host",))
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """Raised without contacting the host while its breaker is open."""
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe may."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class LatencyWindow:
+    """The last LATENCY_WINDOW successful latencies of a host."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> float:
+        """95th percentile, or None below HEDGE_MIN_SAMPLES samples."""
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class LastGood:
+    """Bodies of successful responses keyed by URL and params."""
+
+    def __init__(self, maxsize: int = LAST_GOOD_SIZE, ttl: float = LAST_GOOD_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def key(url: str, params: dict) -> tuple:
+        return (url, tuple(sorted((params or {}).items())))
+
+    def put(self, key: tuple, response: requests.Response):
+        self._cache.set(key, (response.content, response.headers.get("Content-Type"), time.time()))
+
+    def response(self, key: tuple, url: str) -> requests.Response:
+        """A stand-in Response carrying the stored body and `stale_age`, or None."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        content, content_type, fetched_at = entry
+        r = requests.Response()
+        r.status_code = 200
+        r._content = content
+        r.url = url
+        r.encoding = "utf-8"
+        if content_type:
+            r.headers["Content-Type"] = content_type
+        r.stale_age = time.time() - fetched_at
+        return r
+
+_breakers = {}
+_latencies = {}
+_lock = threading.Lock()
+
+def breaker(host: str) -> CircuitBreaker:
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+def latency(host: str) -> LatencyWindow:
+    with _lock:
+        if host not in _latencies:
+            _latencies[host] = LatencyWindow()
+        return _latencies[host]
+
+def stale_age(response: requests.Response) -> float:
+    """Seconds since a last-good response was fetched; None for live responses."""
+    return getattr(response, "stale_age", None)
+
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+def _breaker_states() -> dict:
+    with _lock:
+        items = list(_breakers.items())
+    return {(host,): _STATE_VALUES[b.state] for host, b in items}
+
+gauge("fishbuddy_upstream_breaker_state", "Circuit breaker per host (0 closed, 1 half-open, 2 open).",
+      ("host",), _breaker_states)
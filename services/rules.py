@@ -1,24 +1,286 @@
-import json, os
+import json, os, threading, time, unicodedata
 from datetime import date
 
 DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "rules.json")
 
+# check_rules stats the rules file at most this often to pick up edits
+RELOAD_CHECK_INTERVAL = float(os.environ.get("RULES_RELOAD_INTERVAL", "2"))
+
 def load_rules() -> dict:
     if not os.path.exists(DATA_PATH):
         return {"cantons": {}}
     with open(DATA_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def check_rules(canton: str, species: str, method: str, date_iso: str) -> dict:
-    rules = load_rules()
-    c = (canton or "").strip().lower()
-    s = (species or "").strip().lower()
-    m = (method or "").strip().lower()
-    day = date.fromisoformat(date_iso)
-    entry = (rules.get("cantons", {}).get(c, {}).get("species", {}).get(s, {}))
-    closed_ranges = entry.get("closed_seasons", [])
-    min_size = entry.get("min_size_cm")
-    bag = entry.get("bag_limit")
-    closed = any(r["from"] <= date_iso <= r["to"] for r in closed_ranges)
-    legal = not closed and (method in entry.get("methods_allowed", []) if entry.get("methods_allowed") else True)
-    return {"legal": legal, "closed": closed, "min_size_cm": min_size, "bag_limit": bag}
+def _norm(s: str) -> str:
+    """Lower-case, collapse whitespace and strip accents ("Äsche" -> "asche")."""
+    s = " ".join((s or "").split()).casefold()
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+def _in_year(year: int, month_day: tuple) -> int:
+    """Ordinal of (month, day) in `year`; Feb 29 falls back to Feb 28 outside leap years."""
+    month, day = month_day
+    try:
+        return date(year, month, day).toordinal()
+    except ValueError:
+        return date(year, month, 28).toordinal()
+
+class SpeciesRules:
+    """
+    Compiled rules of one species in one canton. Closed seasons recur
+    every year: only the month and day of their dates are used, and a
+    season ending before it starts (in the calendar) runs over New Year.
+    """
+
+    __slots__ = ("canton", "species", "min_size_cm", "bag_limit", "methods", "seasons", "sources")
+
+    def __init__(self, canton: str, species: str, entry: dict):
+        self.canton = canton
+        self.species = species
+        self.min_size_cm = entry.get("min_size_cm")
+        self.bag_limit = entry.get("bag_limit")
+        self.methods = frozenset(_norm(m) for m in entry.get("methods_allowed") or [])
+        self.sources = entry.get("sources", [])
+
+        # Closed seasons as ((month, day), (month, day)) bounds
+        self.seasons = []
+        for r in entry.get("closed_seasons", []):
+            start, end = date.fromisoformat(r["from"]), date.fromisoformat(r["to"])
+            if (end - start).days >= 365:
+                self.seasons.append(((1, 1), (12, 31)))
+            else:
+                self.seasons.append(((start.month, start.day), (end.month, end.day)))
+
+    def _intervals(self, first: int, last: int) -> list:
+        """Sorted, merged [start, end] ordinal-day closed intervals overlapping [first, last]."""
+        ranges = []
+        for year in range(date.fromordinal(first).year - 1, date.fromordinal(last).year + 1):
+            for since, until in self.seasons:
+                start = _in_year(year, since)
+                end = _in_year(year + 1 if until < since else year, until)
+                if start <= last and end >= first:
+                    ranges.append((start, end))
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def is_closed(self, day: int) -> bool:
+        """Whether the ordinal `day` falls inside a closed season."""
+        return bool(self._intervals(day, day))
+
+    def closed_mask(self, first: int, days: int) -> bytearray:
+        """One byte per day from ordinal `first`: 1 inside a closed season, 0 otherwise."""
+        mask = bytearray(days)
+        for start, end in self._intervals(first, first + days - 1):
+            lo, hi = max(start - first, 0), min(end - first + 1, days)
+            if lo < hi:
+                mask[lo:hi] = b"\x01" * (hi - lo)
+        return mask
+
+    def transitions(self, first: int, days: int) -> list:
+        """[(ordinal, closed)] for each day in the range where the state changes."""
+        last = first + days - 1
+        out = []
+        for start, end in self._intervals(first, last):
+            if first < start <= last:
+                out.append((start, True))
+            if first <= end < last:
+                out.append((end + 1, False))
+        return out
+
+    def method_allowed(self, method: str) -> bool:
+        return not self.methods or not method or _norm(method) in self.methods
+
+class RulesIndex:
+    """
+    `data/rules.json` compiled into a flat (canton, species) lookup.
+    Cantons are reachable by code and name, species by their key and
+    `name_de` alias, all normalized with `_norm`.
+    """
+
+    def __init__(self, rules: dict, mtime: float = None):
+        self.mtime = mtime
+        self.cantons = {}   # canton alias -> canonical code
+        self.species = {}   # (code, species alias) -> SpeciesRules
+        self.by_canton = {}  # code -> [SpeciesRules]
+
+        for code, canton in (rules.get("cantons") or {}).items():
+            code = _norm(code)
+            self.cantons[code] = code
+            if canton.get("name"):
+                self.cantons[_norm(canton["name"])] = code
+
+            compiled = []
+            for key, entry in (canton.get("species") or {}).items():
+                sr = SpeciesRules(code, key, entry)
+                compiled.append(sr)
+                self.species[(code, _norm(key))] = sr
+                if entry.get("name_de"):
+                    self.species.setdefault((code, _norm(entry["name_de"])), sr)
+            self.by_canton[code] = compiled
+
+    def canton_code(self, canton: str) -> str:
+        return self.cantons.get(_norm(canton))
+
+    def lookup(self, canton: str, species: str) -> SpeciesRules:
+        code = self.canton_code(canton)
+        return self.species.get((code, _norm(species))) if code else None
+
+_index = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+
+def _file_mtime():
+    try:
+        return os.stat(DATA_PATH).st_mtime
+    except OSError:
+        return None
+
+def rules_index() -> RulesIndex:
+    """
+    Return the compiled rules, rebuilding only when the file's mtime has
+    changed (checked at most every RELOAD_CHECK_INTERVAL seconds).
+    """
+    global _index, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        if _index is None or now - _checked_at >= RELOAD_CHECK_INTERVAL:
+            mtime = _file_mtime()
+            if _index is None or mtime != _index.mtime:
+                _index = RulesIndex(load_rules(), mtime=mtime)
+            _checked_at = time.monotonic()
+    return _index
+
+def rules_version():
+    """Opaque token that changes whenever the rules file is reloaded."""
+    return rules_index().mtime
+
+def check_rules(canton: str = "", species: str = "", method: str = "", date_iso: str = None,
+                language: str = "de", lat: float = None, lon: float = None) -> dict:
+    """
+    Legality of fishing `species` (optionally with `method`) on `date_iso`.
+    Without a canton, it is resolved from lat/lon against the canton outlines.
+    """
+    if not canton and lat is not None and lon is not None:
+        from .cantons import canton_at
+        canton = canton_at(lat, lon) or ""
+    day = date.fromisoformat(date_iso) if date_iso else date.today()
+    entry = rules_index().lookup(canton, species)
+    if entry is None:
+        return {"legal": True, "closed": False, "min_size_cm": None, "bag_limit": None}
+
+    closed = entry.is_closed(day.toordinal())
+    legal = not closed and entry.method_allowed(method)
+    return {
+        "species": entry.species,
+        "legal": legal,
+        "closed": closed,
+        "min_size_cm": entry.min_size_cm,
+        "bag_limit": entry.bag_limit,
+    }
+
+def canton_rules(canton: str, date_iso: str = None) -> dict:
+    """
+    Rules of every species listed for a canton on one day.
+    Returns {"canton", "species": [{"species", "closed", "min_size_cm", "bag_limit", "methods_allowed"}]}.
+    """
+    index = rules_index()
+    code = index.canton_code(canton)
+    if code is None:
+        return {"canton": canton, "species": []}
+
+    day = (date.fromisoformat(date_iso) if date_iso else date.today()).toordinal()
+    return {
+        "canton": code.upper(),
+        "species": [
+            {
+                "species": sr.species,
+                "closed": sr.is_closed(day),
+                "min_size_cm": sr.min_size_cm,
+                "bag_limit": sr.bag_limit,
+                "methods_allowed": sorted(sr.methods),
+            }
+            for sr in index.by_canton.get(code, [])
+        ],
+    }
+
+# Longest range rules_calendar answers in one call
+CALENDAR_MAX_DAYS = int(os.environ.get("RULES_CALENDAR_MAX_DAYS", "731"))
+
+_DAY_CHARS = bytes.maketrans(b"\x00\x01", b"oc")
+
+def _species_list(species) -> list:
+    if isinstance(species, str):
+        species = species.split(",")
+    return [s.strip() for s in species or [] if s and s.strip()]
+
+def rules_calendar(canton: str, species=None, date_from: str = None, date_to: str = None,
+                   days: bool = False) -> dict:
+    """
+    Open/closed state of each species in a canton for every day of
+    [date_from, date_to] (default: the current calendar year), computed
+    from the closed-season intervals in one pass per species.
+    `species` is a list or comma-separated string; empty means all species.
+    Returns {"canton", "from", "to", "species": [{"species", "closed_at_start",
+    "transitions": [{"date", "closed"}], "open_days"}], "unknown"}; with
+    `days`, each species also gets "days", one "o" (open) or "c" (closed)
+    character per day.
+    """
+    index = rules_index()
+    code = index.canton_code(canton)
+    if code is None:
+        return {"error": "unknown_canton", "canton": canton}
+
+    year = date.today().year
+    start = date.fromisoformat(date_from) if date_from else date(year, 1, 1)
+    end = date.fromisoformat(date_to) if date_to else date(start.year, 12, 31)
+    n = end.toordinal() - start.toordinal() + 1
+    if n < 1:
+        return {"error": "empty_range", "from": start.isoformat(), "to": end.isoformat()}
+    if n > CALENDAR_MAX_DAYS:
+        return {"error": f"range_too_long: at most {CALENDAR_MAX_DAYS} days"}
+
+    wanted = _species_list(species)
+    unknown = []
+    if wanted:
+        selected = []
+        for name in wanted:
+            sr = index.species.get((code, _norm(name)))
+            if sr is None:
+                unknown.append(name)
+            elif sr not in selected:
+                selected.append(sr)
+    else:
+        selected = index.by_canton.get(code, [])
+
+    first = start.toordinal()
+    out = []
+    for sr in selected:
+        mask = sr.closed_mask(first, n)
+        row = {
+            "species": sr.species,
+            "closed_at_start": bool(mask[0]),
+            "transitions": [
+                {"date": date.fromordinal(day).isoformat(), "closed": closed}
+                for day, closed in sr.transitions(first, n)
+            ],
+            "open_days": n - mask.count(1),
+        }
+        if days:
+            row["days"] = mask.translate(_DAY_CHARS).decode("ascii")
+        out.append(row)
+
+    return {
+        "canton": code.upper(),
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "species": out,
+        "unknown": unknown,
+    }
@@ -0,0 +1,179 @@
+# services/runs.py
+"""
+Background drivers for streamed assistant runs.
+
+A run's payloads are produced on a worker thread and appended to a
+bounded ring buffer, independent of any HTTP connection. SSE clients
+follow the buffer and can reconnect with the `Last-Event-ID` they last
+saw; reconnecting only replays buffered frames and never touches the
+upstream run. Buffers are per process, so resuming needs the reconnect
+to reach the same worker (sticky sessions when load balancing).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrent runs driven in the background; further runs queue
+WORKERS = int(os.environ.get("RUN_WORKERS", "64"))
+# Frames kept per run for resuming clients
+BUFFER_EVENTS = int(os.environ.get("RUN_BUFFER_EVENTS", "2048"))
+# How long a finished run stays attachable
+LINGER = float(os.environ.get("RUN_LINGER", "300"))
+# Comment frame interval that keeps idle connections open through proxies
+KEEPALIVE = float(os.environ.get("RUN_KEEPALIVE", "15"))
+
+class RunStream:
+    """
+    Ring buffer of SSE frames for one run. Text payloads are also
+    accumulated so a client that fell behind the ring can be resynced
+    with a single {"replace": text} frame.
+    """
+
+    def __init__(self, key: str, content: str = None, maxlen: int = BUFFER_EVENTS):
+        self.id = uuid.uuid4().hex[:16]
+        self.key = key
+        self.content = content
+        self.seq = 0
+        self.done = False
+        self.failed = False
+        self.finished_at = None
+        self._events = deque(maxlen=maxlen)  # (seq, frame, text length before this frame)
+        self._text = []
+        self._text_len = 0
+        self._cond = threading.Condition()
+
+    def publish(self, payload: dict):
+        with self._cond:
+            self.seq += 1
+            frame = f"id: {self.id}.{self.seq}\ndata: {json.dumps(payload)}\n\n"
+            self._events.append((self.seq, frame, self._text_len))
+            text = payload.get("text")
+            if text:
+                self._text.append(text)
+                self._text_len += len(text)
+            if "error" in payload:
+                self.failed = True
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    @property
+    def text(self) -> str:
+        with self._cond:
+            return "".join(self._text)
+
+    def follow(self, after: int = 0, keepalive: float = KEEPALIVE):
+        """Yield frames with a sequence number above `after` until the run is done."""
+        yield "retry: 2000\n\n"
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self.seq > after or self.done, keepalive):
+                    frames = None
+                else:
+                    frames = [(s, f, t) for s, f, t in self._events if s > after]
+                    if frames and frames[0][0] > after + 1:
+                        # Fell out of the ring: resync the text up to the oldest kept frame
+                        resync = "".join(self._text)[:frames[0][2]]
+                        frames.insert(0, (None, f"data: {json.dumps({'replace': resync})}\n\n", None))
+                    done = self.done
+            if frames is None:
+                yield ": keepalive\n\n"
+                continue
+            for seq, frame, _ in frames:
+                yield frame
+                if seq is not None:
+                    after = seq
+            if done and after >= self.seq:
+                return
+
+class RunManager:
+    """
+    Tracks run streams by id and by key: `reserve` claims a key, then
+    `drive` runs the stream's producer on a worker pool or `release`
+    finishes it unused.
+    """
+
+    def __init__(self, workers: int = WORKERS, linger: float = LINGER):
+        self.linger = linger
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="run-driver")
+        self._streams = {}  # stream id -> RunStream
+        self._by_key = {}   # key (thread id) -> latest RunStream
+        self._lock = threading.Lock()
+        self._reaped_at = 0.0
+
+    def reserve(self, key: str, content: str = None) -> tuple:
+        """
+        Register a new, not yet driven stream for `key` and return
+        (stream, True), or (the unfinished stream, False) if `key` already
+        has one. Checking and registering happen under one lock, so of two
+        concurrent requests for a key only one gets to start a run.
+        `content` is the message that starts the run.
+        """
+        with self._lock:
+            current = self._by_key.get(key)
+            if current is not None and not current.done:
+                return current, False
+            self._reap()
+            stream = RunStream(key, content)
+            self._streams[stream.id] = stream
+            self._by_key[key] = stream
+        return stream, True
+
+    def drive(self, stream: RunStream, payloads):
+        """
+        Drive the iterable `payloads` in the background, publishing each
+        payload and a final {"done": True}; an exception is published as
+        {"error"}.
+        """
+        self._pool.submit(self._drive, stream, payloads)
+
+    def release(self, stream: RunStream, error: str = None):
+        """Finish a reserved stream that won't be driven; clients following it see `error`, if given."""
+        if error is not None:
+            stream.publish({"error": error})
+        stream.publish({"done": True})
+        stream.close()
+
+    def _drive(self, stream: RunStream, payloads):
+        try:
+            for payload in payloads:
+                stream.publish(payload)
+        except Exception as e:
+            stream.publish({"error": str(e)})
+        finally:
+            stream.publish({"done": True})
+            stream.close()
+
+    def get(self, stream_id: str) -> RunStream:
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def _reap(self):
+        now = time.monotonic()
+        if now - self._reaped_at < 10:
+            return
+        self._reaped_at = now
+        for sid, stream in list(self._streams.items()):
+            if stream.done and now - stream.finished_at > self.linger:
+                del self._streams[sid]
+                if self._by_key.get(stream.key) is stream:
+                    del self._by_key[stream.key]
+
+    def __len__(self):
+        return len(self._streams)
+
+def parse_event_id(value: str) -> tuple:
+    """Split a `Last-Event-ID` of the form "<stream id>.<seq>"; (None, 0) if malformed."""
+    stream_id, _, seq = (value or "").partition(".")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None, 0
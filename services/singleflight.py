@@ -0,0 +1,124 @@
+# services/singleflight.py
+"""
+Request coalescing for concurrent identical upstream calls.
+
+When several callers miss the same cache key at once, only the first
+(the leader) runs the fetch; the others wait for it and receive the
+same result or exception. Nothing is stored once the call returns, so
+this complements the TTL caches rather than replacing them.
+
+`SingleFlight` is for code running on threads, which is every service
+call, including those the ASGI app dispatches to its executor.
+`AsyncSingleFlight` coalesces awaitables on one event loop.
+"""
+import asyncio
+import threading
+
+from .metrics import counter
+
+SHARED = counter("fishbuddy_singleflight_shared_total",
+                 "Calls that joined an identical in-flight call instead of running their own.", ("flight",))
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Thread-safe: concurrent `do` calls with the same key run `fn` once."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SHARED.inc(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(self, keys, fn, *args, **kwargs) -> dict:
+        """
+        `do` for several keys at once. Keys already in flight are joined;
+        the others are led together by one `fn(led_keys, *args, **kwargs)`
+        call returning a result per key, in order. Returns {key: result},
+        with the exception as the result for keys whose call failed.
+        """
+        led, joined = {}, {}
+        with self._lock:
+            for key in keys:
+                if key in led or key in joined:
+                    continue
+                call = self._calls.get(key)
+                if call is None:
+                    led[key] = self._calls[key] = _Call()
+                else:
+                    joined[key] = call
+
+        results = {}
+        if led:
+            try:
+                for key, result in zip(led, fn(list(led), *args, **kwargs)):
+                    led[key].result = results[key] = result
+            except Exception as e:
+                for key, call in led.items():
+                    call.error = results[key] = e
+            except BaseException as e:
+                for call in led.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._calls[key]
+                for call in led.values():
+                    call.done.set()
+
+        for key, call in joined.items():
+            SHARED.inc(self.name)
+            call.done.wait()
+            results[key] = call.error if call.error is not None else call.result
+        return results
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for one event loop. The shared
+    task is shielded, so a cancelled waiter doesn't cancel it for the
+    others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            SHARED.inc(self.name)
+        return await asyncio.shield(task)
@@ -0,0 +1,101 @@
+# services/spatial.py
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+
+# Projected distances are computed with a single reference latitude, which
+# over- or under-estimates true distance by a few percent across Switzerland.
+# Ring search bounds are relaxed by this factor so no candidate is missed.
+_PROJECTION_SLACK = 0.85
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
+    return 2*EARTH_RADIUS_KM*math.asin(math.sqrt(a))
+
+class GridIndex:
+    """
+    Fixed-size grid buckets over an equirectangular projection (km).
+    Answers nearest / k-nearest-within-radius queries by searching rings of
+    cells outward from the query cell; results are ranked by haversine
+    distance. Build once, query from any thread.
+    """
+
+    def __init__(self, points, cell_km: float = 10.0, ref_lat: float = 46.8):
+        """`points` is an iterable of (lat, lon, item)."""
+        self.cell_km = cell_km
+        self._kx = KM_PER_DEG * math.cos(math.radians(ref_lat))
+        self._points = []
+        self._cells = {}
+        for lat, lon, item in points:
+            idx = len(self._points)
+            self._points.append((lat, lon, item))
+            self._cells.setdefault(self._cell(lat, lon), []).append(idx)
+
+        if self._cells:
+            xs = [c[0] for c in self._cells]
+            ys = [c[1] for c in self._cells]
+            self._bounds = (min(xs), max(xs), min(ys), max(ys))
+        else:
+            self._bounds = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def items(self) -> list:
+        """All indexed items, in insertion order."""
+        return [item for _, _, item in self._points]
+
+    def _cell(self, lat, lon) -> tuple:
+        return (
+            math.floor(lon * self._kx / self.cell_km),
+            math.floor(lat * KM_PER_DEG / self.cell_km),
+        )
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+    def nearest(self, lat: float, lon: float, k: int = 1, radius_km: float = None) -> list:
+        """
+        Return up to `k` (distance_km, item) pairs closest to (lat, lon),
+        nearest first, optionally limited to `radius_km`.
+        """
+        if not self._bounds or k < 1:
+            return []
+
+        cx, cy = self._cell(lat, lon)
+        x0, x1, y0, y1 = self._bounds
+        max_ring = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+        best = []  # max-heap of (-distance, idx)
+        for r in range(max_ring + 1):
+            for cell in self._ring(cx, cy, r):
+                for idx in self._cells.get(cell, ()):
+                    plat, plon, _ = self._points[idx]
+                    d = haversine_km(lat, lon, plat, plon)
+                    if radius_km is not None and d > radius_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, idx))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, idx))
+
+            # Every point in ring r+1 is at least r cells away
+            lower = r * self.cell_km * _PROJECTION_SLACK
+            if radius_km is not None and lower > radius_km:
+                break
+            if len(best) == k and lower > -best[0][0]:
+                break
+
+        return [(-neg, self._points[idx][2]) for neg, idx in sorted(best, reverse=True)]
@@ -1,8 +1,33 @@
-import requests
 import json
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
+from . import http_client
+from .resilience import stale_age
+from .singleflight import SingleFlight
+from .cache import TTLCache
+from .metrics import register_cache
+
+GBIF_BASE = os.environ.get("GBIF_API_BASE", "https://api.gbif.org/v1")
+
+# Occurrence data changes slowly: facet counts are cached per snapped grid
+# tile and radius, species names (immutable per key) for much longer.
+TILE_DEG = float(os.environ.get("SPECIES_TILE_DEG", "0.02"))
+_tile_cache = TTLCache(
+    maxsize=int(os.environ.get("SPECIES_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("SPECIES_CACHE_TTL", "21600")),
+)
+_name_cache = TTLCache(maxsize=4096, ttl=30 * 86400)
+register_cache("species_tile", _tile_cache.stats)
+register_cache("species_name", _name_cache.stats)
+_name_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gbif-name")
+# Concurrent misses for the same tile or species key share one request
+_tile_flight = SingleFlight("species_tile")
+_name_flight = SingleFlight("species_name")
+TOP_SPECIES = 20
+
 def _wkt_square(lat: float, lon: float, km: float = 5.0) -> str:
     """Generate WKT polygon around a point."""
     dlat = km * 0.009
@@ -16,60 +41,121 @@ def _wkt_square(lat: float, lon: float, km: float = 5.0) -> str:
     ]
     return "POLYGON((" + ", ".join(f"{x} {y}" for x,y in pts) + "))"
 
-def list_species_by_place(place: str, language: str = "de", radius_km: float = 5.0, timeout: float = 12.0) -> dict:
+def _snap(value: float) -> float:
+    return round(round(value / TILE_DEG) * TILE_DEG, 6)
+
+def species_cache_stats() -> dict:
+    """Return counters of the tile cache."""
+    return _tile_cache.stats()
+
+def _species_name(key: str, timeout: float) -> dict:
+    """Resolve a GBIF speciesKey to {"name", "scientific_name"} (cached)."""
+    cached = _name_cache.get(key)
+    if cached is not None:
+        return cached
+    return _name_flight.do(key, _fetch_species_name, key, timeout)
+
+def _species_name_or_key(key: str, timeout: float) -> dict:
+    """_species_name, falling back to the bare key so one failed lookup keeps the counts."""
+    try:
+        return _species_name(key, timeout)
+    except Exception:
+        return {"name": key, "scientific_name": None}
+
+def _fetch_species_name(key: str, timeout: float) -> dict:
+    r = http_client.get(f"{GBIF_BASE}/species/{key}", timeout=timeout, stale_ok=True)
+    r.raise_for_status()
+    data = r.json() or {}
+    info = {
+        "name": data.get("species") or data.get("canonicalName") or key,
+        "scientific_name": data.get("scientificName"),
+    }
+    _name_cache.set(key, info)
+    return info
+
+def _species_counts(lat: float, lon: float, radius_km: float, timeout: float) -> dict:
     """
-    Query GBIF occurrence API with geometry=WKT to find fish species near a place.
-    Filters for Actinopterygii (ray-finned fishes) and Petromyzontida (lampreys).
-    Returns {"place", "provider": "gbif", "species": [{"name", "count", "scientific_name"}]}.
+    Fetch per-species occurrence counts for a tile from GBIF facets.
+    Aggregation happens server side (facet=speciesKey, limit=0), so the
+    counts cover every matching record, not just one page of results.
+    While GBIF is unavailable the last good counts are returned with
+    "stale_s" and not cached.
     """
-    from .geocode import geocode_place
-
-    g = geocode_place(place, language=language, timeout=timeout)
-    if "error" in g:
-        return {"error": "geocode_failed"}
+    key = (lat, lon, radius_km)
+    cached = _tile_cache.get(key)
+    if cached is not None:
+        return cached
+    return _tile_flight.do(key, _fetch_species_counts, key, timeout)
 
-    wkt = _wkt_square(g["lat"], g["lon"], km=radius_km)
-    
+def _fetch_species_counts(key: tuple, timeout: float) -> dict:
+    lat, lon, radius_km = key
     # Query GBIF with geometry (WKT polygon) filtering for fish
     # kingdomKey=1 is Animalia; classKey includes ray-finned fishes (Actinopterygii) and lampreys
     params = {
-        "geometry": wkt,
+        "geometry": _wkt_square(lat, lon, km=radius_km),
         "country": "CH",
         "hasCoordinate": "true",
         "kingdom": "Animalia",
         "classKey": "127206",  # Actinopterygii (ray-finned fishes)
-        "limit": 300,
-        "offset": 0
+        "limit": 0,
+        "facet": "speciesKey",
+        "facetLimit": TOP_SPECIES,
     }
-    headers = {"User-Agent": "FischBuddy/1.0 (+https://github.com/yourname/fishbuddy)"}
-    
+    r = http_client.get(f"{GBIF_BASE}/occurrence/search", params=params, timeout=timeout, stale_ok=True)
+    r.raise_for_status()
+    data = r.json() or {}
+
+    counts = []
+    for facet in data.get("facets", []):
+        if facet.get("field") == "SPECIES_KEY":
+            counts = facet.get("counts", [])
+            break
+
+    names = list(_name_pool.map(lambda c: _species_name_or_key(c["name"], timeout), counts))
+    result = {
+        "total_records": data.get("count"),
+        "species": [
+            {"name": info["name"], "count": c["count"], "scientific_name": info["scientific_name"]}
+            for c, info in zip(counts, names)
+        ],
+    }
+    age = stale_age(r)
+    if age is not None:
+        result["stale_s"] = round(age)
+        return result
+    _tile_cache.set(key, result)
+    return result
+
+def species_near(lat: float, lon: float, radius_km: float = 5.0, timeout: float = 12.0) -> dict:
+    """
+    Per-species fish occurrence counts around (lat, lon).
+    Returns {"total_records", "species": [{"name", "count", "scientific_name"}]}.
+    """
+    return _species_counts(_snap(lat), _snap(lon), float(radius_km), timeout)
+
+def list_species_by_place(place: str, language: str = "de", radius_km: float = 5.0, timeout: float = 12.0) -> dict:
+    """
+    Count fish occurrences per species near a place using GBIF facets.
+    Filters for Actinopterygii (ray-finned fishes); results are cached per
+    snapped grid tile and radius.
+    Returns {"place", "provider": "gbif", "species": [{"name", "count", "scientific_name"}]}.
+    """
+    from .geocode import geocode_place
+
+    g = geocode_place(place, language=language, timeout=timeout)
+    if "error" in g:
+        return {"error": "geocode_failed"}
+
     try:
-        r = requests.get("https://api.gbif.org/v1/occurrence/search", params=params, headers=headers, timeout=timeout)
-        r.raise_for_status()
-        data = r.json() or {}
-        
-        # Aggregate species counts and common names
-        species_map = {}
-        for rec in data.get("results", []):
-            sp = rec.get("species")
-            sci_name = rec.get("scientificName")
-            if sp and sci_name:
-                if sp not in species_map:
-                    species_map[sp] = {"count": 0, "scientific_name": sci_name}
-                species_map[sp]["count"] += 1
-        
-        # Sort by count descending, take top 20
-        top = sorted(species_map.items(), key=lambda kv: kv[1]["count"], reverse=True)[:20]
-        
+        counts = species_near(g["lat"], g["lon"], radius_km=radius_km, timeout=timeout)
         return {
             "place": g.get("name"),
             "provider": "gbif",
             "region": g.get("admin1"),
             "data_source": "GBIF Swiss Node - Swiss National Fish Databank",
-            "species": [
-                {"name": name, "count": info["count"], "scientific_name": info["scientific_name"]}
-                for name, info in top
-            ]
+            "total_records": counts["total_records"],
+            "species": counts["species"],
+            "stale_s": counts.get("stale_s"),
         }
     except Exception as e:
         return {
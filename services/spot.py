@@ -0,0 +1,74 @@
+# services/spot.py
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .geocode import geocode_place, canton_code
+from .hydro import water_data_at
+from .rules import check_rules, canton_rules, rules_index
+from .species import species_near
+from .weather import current_weather
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="spot")
+
+# Keep the composite document small; the model rarely needs more than this
+SPOT_TOP_SPECIES = 10
+
+def _guard(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        return {"error": f"{fn.__name__}_failed: {e.__class__.__name__}"}
+
+def _done(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+def get_spot_report(name: str, species: str = "", method: str = "", date_iso: str = "",
+                    language: str = "de", radius_km: float = 5.0, timeout: float = 10.0) -> dict:
+    """
+    Everything about a fishing spot in one call: geocodes once, then gathers
+    weather, nearest-station water data, species and the canton's rules
+    concurrently. Each section carries its own {"error"} on failure; rules
+    are {"error"} when the canton or the species has no rules entry.
+    Returns {"place", "lat", "lon", "canton", "weather", "water", "species", "rules"}.
+    """
+    g = geocode_place(name, language=language, timeout=timeout)
+    if "error" in g:
+        return {"error": "geocode_failed", "place": name}
+
+    lat, lon = g["lat"], g["lon"]
+    canton = canton_code(g)
+
+    weather = _pool.submit(_guard, current_weather, lat, lon, timeout=timeout)
+    water = _pool.submit(_guard, water_data_at, lat, lon, k=1, timeout=timeout)
+    fish = _pool.submit(_guard, species_near, lat, lon, radius_km=radius_km, timeout=timeout)
+    # check_rules reports a missing entry as legal; never let that reach the model
+    if canton == "UNKNOWN":
+        rules = _done({"error": "unknown_canton"})
+    elif rules_index().canton_code(canton) is None:
+        rules = _done({"error": "no_rules_for_canton", "canton": canton})
+    elif species and rules_index().lookup(canton, species) is None:
+        rules = _done({"error": "no_rules_for_species", "canton": canton, "species": species})
+    elif species:
+        rules = _pool.submit(_guard, check_rules, canton, species=species, method=method, date_iso=date_iso or None)
+    else:
+        rules = _pool.submit(_guard, canton_rules, canton, date_iso=date_iso or None)
+
+    water = water.result()
+    if isinstance(water, list):
+        water = water[0] if water else {"note": "No hydrology data available; try again later."}
+
+    fish = fish.result()
+    if "species" in fish:
+        fish = [{"name": s["name"], "count": s["count"]} for s in fish["species"][:SPOT_TOP_SPECIES]]
+
+    return {
+        "place": g.get("name"),
+        "lat": lat,
+        "lon": lon,
+        "canton": canton,
+        "weather": weather.result(),
+        "water": water,
+        "species": fish,
+        "rules": rules.result(),
+    }
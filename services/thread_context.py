@@ -0,0 +1,194 @@
+# services/thread_context.py
+"""
+Keeps Assistant runs flat in size as a conversation grows.
+
+- Runs are created with a truncation strategy: by default only the last
+  THREAD_LAST_MESSAGES messages of the thread are sent to the model.
+- StructuredContext is posted in full only when it is new to the thread
+  or its last full copy is about to fall out of that window. Otherwise
+  only the keys that changed are posted, or nothing when it is unchanged.
+- With THREAD_SUMMARY=1, messages that fell out of the window are rolled
+  into a short summary that later runs get as additional instructions.
+
+State is kept per process; a worker that hasn't seen a thread (or has
+evicted it) posts the full context, which is always safe.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .cache import TTLCache
+
+log = logging.getLogger("fishbuddy.context")
+
+# "last_messages", "auto" (let OpenAI decide) or "none" (send the whole thread)
+TRUNCATION = os.environ.get("THREAD_TRUNCATION", "last_messages")
+LAST_MESSAGES = int(os.environ.get("THREAD_LAST_MESSAGES", "10"))
+# Optional hard cap per run; 0 leaves it to the model's context size
+MAX_PROMPT_TOKENS = int(os.environ.get("THREAD_MAX_PROMPT_TOKENS", "0"))
+CONTEXT_DELTA = os.environ.get("THREAD_CONTEXT_DELTA", "1") == "1"
+
+SUMMARY = os.environ.get("THREAD_SUMMARY", "0") == "1"
+SUMMARY_MODEL = os.environ.get("THREAD_SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_WORDS = int(os.environ.get("THREAD_SUMMARY_WORDS", "120"))
+# Summarize once at least this many messages have left the window
+SUMMARY_BATCH = int(os.environ.get("THREAD_SUMMARY_BATCH", "4"))
+
+STATE_SIZE = int(os.environ.get("THREAD_STATE_SIZE", "10000"))
+STATE_TTL = float(os.environ.get("THREAD_STATE_TTL", "86400"))
+
+# A turn adds the user message and (usually) one assistant message
+_MESSAGES_PER_TURN = 2
+# Longest message text fed into a summary
+_SUMMARY_MESSAGE_CHARS = 600
+
+CONTEXT_POSTS = metrics.counter("fishbuddy_context_posts_total",
+                                "User messages by how StructuredContext was sent.", ("mode",))
+SUMMARIES = metrics.counter("fishbuddy_thread_summaries_total", "Thread summaries written.", ("outcome",))
+
+class _ThreadState:
+    __slots__ = ("context", "turns", "full_turn", "summary", "summarized", "summary_until", "summarizing")
+
+    def __init__(self):
+        self.context = None      # last context the thread has seen
+        self.turns = 0
+        self.full_turn = None    # turn of the last full StructuredContext
+        self.summary = None
+        self.summarized = 0      # messages out of the window already summarized
+        self.summary_until = None  # id of the newest summarized message
+        self.summarizing = False
+
+def _delta(old: dict, new: dict) -> dict:
+    """Changed and added keys of `new`; removed keys map to None."""
+    changed = {k: v for k, v in new.items() if old.get(k, object()) != v}
+    changed.update({k: None for k in old if k not in new})
+    return changed
+
+def _message_text(message) -> str:
+    parts = []
+    for part in getattr(message, "content", None) or []:
+        text = getattr(part, "text", None)
+        if text is not None and getattr(text, "value", None):
+            parts.append(text.value)
+    return " ".join(parts)[:_SUMMARY_MESSAGE_CHARS]
+
+class ThreadContext:
+    """Builds user messages and run options per thread; see the module docstring."""
+
+    def __init__(self, client=None):
+        self.client = client
+        self._states = TTLCache(maxsize=STATE_SIZE, ttl=STATE_TTL)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread-summary")
+
+    def _state(self, thread_id: str) -> _ThreadState:
+        state = self._states.get(thread_id)
+        if state is None:
+            state = _ThreadState()
+            self._states.set(thread_id, state)
+        return state
+
+    def _window_turns(self) -> int:
+        """Turns whose messages still reach the model; None when nothing is truncated."""
+        if TRUNCATION == "none":
+            return None
+        return max(1, (LAST_MESSAGES + 1) // _MESSAGES_PER_TURN)
+
+    def compose(self, thread_id: str, context, message: str) -> tuple:
+        """
+        (content, mode): the user message to post for this turn, carrying
+        the full StructuredContext ("full"), only its changed keys
+        ("delta") or none of it ("unchanged"). Nothing is recorded until
+        `commit` is called once the message is posted.
+        """
+        context = context if isinstance(context, dict) else {}
+        with self._lock:
+            state = self._states.get(thread_id) or _ThreadState()
+            window = self._window_turns()
+            in_window = state.full_turn is not None and (window is None or state.turns - state.full_turn < window)
+            if not CONTEXT_DELTA or not in_window:
+                return f"StructuredContext: {context}\nQuestion: {message}", "full"
+            changed = _delta(state.context, context)
+        if changed:
+            return f"StructuredContextUpdate: {changed}\nQuestion: {message}", "delta"
+        return f"Question: {message}", "unchanged"
+
+    def commit(self, thread_id: str, context, mode: str):
+        """Record a turn composed with `context` and `mode` as posted to the thread."""
+        context = context if isinstance(context, dict) else {}
+        with self._lock:
+            state = self._state(thread_id)
+            if mode == "full":
+                state.full_turn = state.turns
+            state.context = dict(context)
+            state.turns += 1
+            self._maybe_summarize(thread_id, state)
+        CONTEXT_POSTS.inc(mode)
+
+    def run_options(self, thread_id: str) -> dict:
+        """Keyword arguments for `runs.create` on this thread."""
+        options = {}
+        if TRUNCATION == "last_messages":
+            options["truncation_strategy"] = {"type": "last_messages", "last_messages": LAST_MESSAGES}
+        elif TRUNCATION == "auto":
+            options["truncation_strategy"] = {"type": "auto"}
+        if MAX_PROMPT_TOKENS:
+            options["max_prompt_tokens"] = MAX_PROMPT_TOKENS
+
+        state = self._states.get(thread_id)
+        if state is not None and state.summary:
+            options["additional_instructions"] = (
+                "Earlier messages of this conversation are not shown. "
+                f"Summary of them: {state.summary}"
+            )
+        return options
+
+    def _maybe_summarize(self, thread_id: str, state: _ThreadState):
+        if not SUMMARY or self.client is None or TRUNCATION != "last_messages" or state.summarizing:
+            return
+        dropped = state.turns * _MESSAGES_PER_TURN - LAST_MESSAGES
+        if dropped - state.summarized < SUMMARY_BATCH:
+            return
+        state.summarizing = True
+        self._pool.submit(self._summarize, thread_id, state, dropped)
+
+    def _summarize(self, thread_id: str, state: _ThreadState, dropped: int):
+        """Fold messages that left the window since the last summary into it."""
+        try:
+            with metrics.openai_call("messages.list"):
+                page = self.client.beta.threads.messages.list(
+                    thread_id=thread_id, order="desc", limit=min(100, LAST_MESSAGES + dropped),
+                )
+            new = []
+            for m in list(page.data)[LAST_MESSAGES:]:
+                if m.id == state.summary_until:
+                    break
+                new.append(m)
+            if not new:
+                return
+            transcript = "\n".join(f"{m.role}: {_message_text(m)}" for m in reversed(new))
+            previous = f"Summary so far: {state.summary}\n\n" if state.summary else ""
+
+            with metrics.openai_call("chat.completions.create"):
+                r = self.client.chat.completions.create(
+                    model=SUMMARY_MODEL,
+                    messages=[
+                        {"role": "system", "content": (
+                            f"Summarize this fishing-advice conversation in at most {SUMMARY_WORDS} words. "
+                            "Keep places, species, dates, methods and rule conclusions; drop pleasantries."
+                        )},
+                        {"role": "user", "content": previous + "New messages:\n" + transcript},
+                    ],
+                    max_tokens=SUMMARY_WORDS * 2,
+                )
+            state.summary = (r.choices[0].message.content or "").strip() or state.summary
+            state.summary_until = new[0].id
+            state.summarized = dropped
+            SUMMARIES.inc("ok")
+        except Exception as e:
+            SUMMARIES.inc("error")
+            log.warning("Could not summarize thread %s: %s", thread_id, e)
+        finally:
+            state.summarizing = False
@@ -0,0 +1,23 @@
+# services/uploads.py
+import hashlib
+import os
+
+# Bytes read per step while hashing an upload; bounds memory per request
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+def sha256_stream(stream, chunk_size: int = CHUNK_SIZE) -> tuple:
+    """
+    Hash a seekable binary stream chunk by chunk and rewind it.
+    Returns (hex digest, size in bytes).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
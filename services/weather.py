@@ -1,6 +1,184 @@
 # services/weather.py
 import requests
-import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http_client
+from .cache import TTLCache
+from .metrics import register_cache
+from .resilience import stale_age
+from .singleflight import SingleFlight
+
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Nearby spots on the same lake fall into the same model grid cell and get
+# identical output, so cache entries are keyed by snapped coordinates.
+GRID_DEG = float(os.environ.get("WEATHER_GRID_DEG", "0.02"))
+# Open-Meteo refreshes "current" values on this cadence; entries are fresh
+# until the next boundary (plus a small publication lag).
+UPDATE_MINUTES = float(os.environ.get("WEATHER_UPDATE_MINUTES", "15"))
+UPDATE_LAG = float(os.environ.get("WEATHER_UPDATE_LAG", "60"))
+# Locations per forecast request when fetching many at once
+BATCH_SIZE = int(os.environ.get("WEATHER_BATCH_SIZE", "100"))
+# How long past freshness an entry may still be served while revalidating
+STALE_WINDOW = float(os.environ.get("WEATHER_STALE_WINDOW", "1800"))
+
+_weather_cache = TTLCache(maxsize=int(os.environ.get("WEATHER_CACHE_SIZE", "4096")))
+_stats = {"fresh": 0, "stale": 0, "miss": 0}
+_stats_lock = threading.Lock()
+_refreshing = set()
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather-refresh")
+# Concurrent misses for the same grid cell share one request
+_flight = SingleFlight("weather")
+
+def _snap(value: float) -> float:
+    return round(round(value / GRID_DEG) * GRID_DEG, 6)
+
+def _next_update(now: float) -> float:
+    """Epoch time at which the current upstream values are superseded."""
+    cycle = UPDATE_MINUTES * 60
+    return (int((now - UPDATE_LAG) // cycle) + 1) * cycle + UPDATE_LAG
+
+def _count(kind: str):
+    with _stats_lock:
+        _stats[kind] += 1
+
+def weather_cache_stats() -> dict:
+    """Return fresh/stale hit and miss counters plus the overall hit rate."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = sum(stats.values())
+    stats["hit_rate"] = round((stats["fresh"] + stats["stale"]) / lookups, 4) if lookups else 0.0
+    stats["size"] = len(_weather_cache)
+    return stats
+
+def _exported_stats() -> dict:
+    stats = weather_cache_stats()
+    return {"hits": stats["fresh"] + stats["stale"], "misses": stats["miss"], "size": stats["size"]}
+
+register_cache("weather", _exported_stats)
+
+def _parse_current(data: dict) -> dict:
+    cur = (data or {}).get("current", {}) or {}
+    return {
+        "air_temp_c": cur.get("temperature_2m"),
+        "wind_ms": cur.get("wind_speed_10m"),
+        "precip_mm": cur.get("precipitation"),
+    }
+
+def _fetch_current(lat: float, lon: float, timeout: float) -> dict:
+    return _fetch_current_many([(lat, lon)], timeout)[0]
+
+def _fetch_current_many(coords: list, timeout: float) -> list:
+    """
+    Current values for several (lat, lon) pairs in one request, in order.
+    Values served from the last good response carry "stale_s".
+    """
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
+        "current": "temperature_2m,wind_speed_10m,precipitation",
+        "timezone": "Europe/Zurich",
+    }
+    r = http_client.get(FORECAST_URL, params=params, timeout=timeout, stale_ok=True)
+    r.raise_for_status()
+    data = r.json()
+    age = stale_age(r)
+    # A single location comes back as an object, several as a list
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(coords):
+        raise ValueError(f"expected {len(coords)} locations, got {len(results)}")
+    currents = [_parse_current(d) for d in results]
+    if age is not None:
+        for current in currents:
+            current["stale_s"] = round(age)
+    return currents
+
+def _store(key: tuple, current: dict):
+    if "stale_s" in current:
+        return  # only live values start a freshness window
+    now = time.time()
+    fresh_until = _next_update(now)
+    _weather_cache.set(key, (fresh_until, current), ttl=fresh_until - now + STALE_WINDOW)
+
+def _revalidate(key: tuple, timeout: float):
+    try:
+        _store(key, _fetch_current(key[0], key[1], timeout))
+    except Exception:
+        pass  # keep serving the stale entry until it ages out
+    finally:
+        with _stats_lock:
+            _refreshing.discard(key)
+
+def _cached(key: tuple, timeout: float) -> dict:
+    """The cached value for a snapped key (revalidating it if stale), or None on a miss."""
+    entry = _weather_cache.get(key)
+    if entry is None:
+        _count("miss")
+        return None
+
+    fresh_until, current = entry
+    if time.time() < fresh_until:
+        _count("fresh")
+        return dict(current)
+
+    _count("stale")
+    with _stats_lock:
+        start = key not in _refreshing
+        _refreshing.add(key)
+    if start:
+        _refresh_pool.submit(_revalidate, key, timeout)
+    return dict(current)
+
+def current_weather(lat: float, lon: float, timeout: float = 10.0) -> dict:
+    """
+    Current conditions for the model grid cell containing (lat, lon).
+    Fresh entries are served until the next upstream update; afterwards
+    the stale entry is returned while a background refresh runs.
+    Returns {"air_temp_c", "wind_ms", "precip_mm"}.
+    """
+    key = (_snap(lat), _snap(lon))
+    current = _cached(key, timeout)
+    if current is None:
+        current = dict(_flight.do(key, _fetch_and_store, key, timeout))
+    return current
+
+def _fetch_and_store(key: tuple, timeout: float) -> dict:
+    current = _fetch_current(key[0], key[1], timeout)
+    _store(key, current)
+    return current
+
+def _fetch_and_store_many(keys: list, timeout: float) -> list:
+    currents = _fetch_current_many(keys, timeout)
+    for key, current in zip(keys, currents):
+        _store(key, current)
+    return currents
+
+def current_weather_many(coords: list, timeout: float = 10.0) -> list:
+    """
+    current_weather for a list of (lat, lon) pairs. Cache misses are
+    deduplicated by grid cell, join fetches already in flight for their
+    cell and are otherwise fetched BATCH_SIZE locations per request.
+    Returns one dict per pair, in order; a failed fetch yields
+    {"error": ...} for its locations.
+    """
+    keys = [(_snap(lat), _snap(lon)) for lat, lon in coords]
+    found = {}
+    missing = []
+    for key in keys:
+        if key in found:
+            continue
+        found[key] = _cached(key, timeout)
+        if found[key] is None:
+            missing.append(key)
+
+    for i in range(0, len(missing), BATCH_SIZE):
+        chunk = missing[i:i + BATCH_SIZE]
+        for key, current in _flight.do_many(chunk, _fetch_and_store_many, timeout).items():
+            found[key] = {"error": f"weather_api_error: {current}"} if isinstance(current, Exception) else current
+    return [dict(found[key]) for key in keys]
 
 def get_weather_by_place(name: str, language: str = "de", timeout: float = 10.0) -> dict:
     """
@@ -8,39 +186,17 @@ def get_weather_by_place(name: str, language: str = "de", timeout: float = 10.0)
     Returns {"place", "air_temp_c", "wind_ms", "precip_mm"}.
     """
     from .geocode import geocode_place
-    
+
     try:
         g = geocode_place(name, language=language, timeout=timeout)
         if "error" in g:
             return {"error": "geocode_failed", "place": name}
-        
-        # Use the main forecast endpoint (wider geographic coverage)
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": g["lat"],
-            "longitude": g["lon"],
-            "current": "temperature_2m,wind_speed_10m,precipitation",
-            "timezone": "Europe/Zurich",
-        }
-        
-        r = requests.get(url, params=params, timeout=timeout)
-        r.raise_for_status()
-        data = r.json() or {}
-        cur = data.get("current", {}) or {}
-        
-        result = {
-            "place": g.get("name"),
-            "air_temp_c": cur.get("temperature_2m"),
-            "wind_ms": cur.get("wind_speed_10m"),
-            "precip_mm": cur.get("precipitation"),
-        }
-        
-        # Return as JSON string for tool compatibility
-        return json.dumps(result)
-    
+
+        return {"place": g.get("name"), **current_weather(g["lat"], g["lon"], timeout=timeout)}
+
     except requests.exceptions.Timeout:
-        return json.dumps({"error": "weather_api_timeout", "place": name})
+        return {"error": "weather_api_timeout", "place": name}
     except requests.exceptions.RequestException as e:
-        return json.dumps({"error": f"weather_api_error: {str(e)}", "place": name})
+        return {"error": f"weather_api_error: {str(e)}", "place": name}
     except Exception as e:
-        return json.dumps({"error": f"weather_failed: {str(e)}", "place": name})
+        return {"error": f"weather_failed: {str(e)}", "place": name}
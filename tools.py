@@ -1,68 +1,74 @@
 # tools.py
-import json
+from services.encoding import encode
 
 def geocode_place(name: str, language: str = "de") -> str:
     """Geocode a place name to coordinates."""
     try:
         from services.geocode import geocode_place as _geocode_place
         result = _geocode_place(name, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        return encode("geocode_place", result)
     except Exception as e:
-        return json.dumps({"error": f"geocode_tool_failed: {str(e)}"})
+        return encode("geocode_place", {"error": f"geocode_tool_failed: {str(e)}"})
 
 def canton_from_place(name: str, language: str = "de") -> str:
     """Get canton from a place name."""
     try:
         from services.geocode import canton_from_place as _canton_from_place
         result = _canton_from_place(name, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        return encode("canton_from_place", result)
     except Exception as e:
-        return json.dumps({"error": f"canton_tool_failed: {str(e)}"})
+        return encode("canton_from_place", {"error": f"canton_tool_failed: {str(e)}"})
 
 def get_weather_by_place(name: str, language: str = "de") -> str:
     """Get current weather for a place."""
     try:
         from services.weather import get_weather_by_place as _get_weather
         result = _get_weather(name, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        return encode("get_weather_by_place", result)
     except Exception as e:
-        return json.dumps({"error": f"weather_tool_failed: {str(e)}"})
+        return encode("get_weather_by_place", {"error": f"weather_tool_failed: {str(e)}"})
 
-def get_water_data(name: str, language: str = "de") -> str:
-    """Get water temperature and flow data for a place."""
+def get_water_data(name: str, language: str = "de", k: int = 1) -> str:
+    """Get water temperature and flow data for a place (k closest stations)."""
     try:
         from services.hydro import get_water_data as _get_hydro
-        result = _get_hydro(name, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        result = _get_hydro(name, language=language, k=k)
+        return encode("get_water_data", result)
     except Exception as e:
-        return json.dumps({"error": f"hydro_tool_failed: {str(e)}"})
+        return encode("get_water_data", {"error": f"hydro_tool_failed: {str(e)}"})
 
 def list_species_by_place(name: str, language: str = "de") -> str:
     """List fish species found near a place."""
     try:
         from services.species import list_species_by_place as _list_species
         result = _list_species(name, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        return encode("list_species_by_place", result)
     except Exception as e:
-        return json.dumps({"error": f"species_tool_failed: {str(e)}"})
+        return encode("list_species_by_place", {"error": f"species_tool_failed: {str(e)}"})
 
-def check_rules(canton: str, species: str = "", language: str = "de") -> str:
-    """Check fishing rules for a canton and species."""
+def check_rules(canton: str, species: str = "", method: str = "", date_iso: str = "", language: str = "de") -> str:
+    """Check fishing rules for a canton and species (optionally method and ISO date)."""
     try:
         from services.rules import check_rules as _check_rules
-        result = _check_rules(canton, species=species, language=language)
-        if isinstance(result, dict):
-            return json.dumps(result)
-        return result
+        result = _check_rules(canton, species=species, method=method, date_iso=date_iso or None, language=language)
+        return encode("check_rules", result)
     except Exception as e:
-        return json.dumps({"error": f"rules_tool_failed: {str(e)}"})
+        return encode("check_rules", {"error": f"rules_tool_failed: {str(e)}"})
+
+def rules_calendar(canton: str, species: str = "", date_from: str = "", date_to: str = "") -> str:
+    """Open/closed calendar of species (comma-separated, default all) in a canton over a date range."""
+    try:
+        from services.rules import rules_calendar as _rules_calendar
+        result = _rules_calendar(canton, species=species, date_from=date_from or None, date_to=date_to or None)
+        return encode("rules_calendar", result)
+    except Exception as e:
+        return encode("rules_calendar", {"error": f"calendar_tool_failed: {str(e)}"})
+
+def get_spot_report(name: str, species: str = "", method: str = "", date_iso: str = "", language: str = "de") -> str:
+    """Get canton, weather, water data, species and rules for a place in one call."""
+    try:
+        from services.spot import get_spot_report as _get_spot_report
+        result = _get_spot_report(name, species=species, method=method, date_iso=date_iso, language=language)
+        return encode("get_spot_report", result)
+    except Exception as e:
+        return encode("get_spot_report", {"error": f"spot_report_tool_failed: {str(e)}"})